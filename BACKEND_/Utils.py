@@ -2,21 +2,71 @@
 
 # Class preprocessing defined #
 import re
-from collections import Counter
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords
+import os
+import json
+import base64
+import logging
+import hashlib
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import Future, InvalidStateError
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
 import numpy as np
 import unicodedata
 import pickle
-from sklearn.ensemble import IsolationForest
-import nltk
 
-# Download required NLTK data
-nltk.download('wordnet')
-nltk.download('stopwords')
+logger = logging.getLogger(__name__)
+
+# nltk and sklearn take seconds to import (nltk pulls scipy and sklearn in), they are imported where used.
+# The NLTK corpora are never downloaded at runtime : they are baked into the image (NLTK_DATA, see the
+# backend Dockerfile), missing_nltk_data reports the ones that cannot be found
+NLTK_RESOURCES = ('corpora/wordnet', 'corpora/stopwords')
+
+# Runs of ASCII letters, i.e. the words left once clean_text blanks everything else
+_WORD_PATTERN = re.compile(r'[a-zA-Z]+')
+
+@lru_cache(maxsize=65536)
+def _lemmatize(lemmatizer, word):
+    """
+    Memoized lemmatization, the same words repeat across requests
+    """
+    return lemmatizer.lemmatize(word)
+
+def missing_nltk_data(resources=NLTK_RESOURCES):
+    """
+    NLTK resources not found in the NLTK_DATA paths
+    """
+    import nltk
+    missing = []
+    for resource in resources:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(resource)
+    return missing
+
+class LazyLemmatizer:
+    """
+    WordNetLemmatizer imported on the first lemmatization, so that loading the compact artifacts
+    does not import nltk
+    """
+    def __init__(self):
+        self._lemmatizer = None
+
+    def lemmatize(self, word, pos='n'):
+        if self._lemmatizer is None:
+            from nltk.stem import WordNetLemmatizer
+            self._lemmatizer = WordNetLemmatizer()
+        return self._lemmatizer.lemmatize(word, pos)
 
 class TextPreprocessor:
     def __init__(self, max_len=200):
+        from nltk.stem import WordNetLemmatizer
+        from nltk.corpus import stopwords
         self.lemmatizer = WordNetLemmatizer()
         self.stop_words = set(stopwords.words('english'))
         self.vocab = None
@@ -27,11 +77,44 @@ class TextPreprocessor:
         """
         Clean and normalize text
         """
-        text = re.sub(r'[^a-zA-Z]', ' ', text)
-        text = text.lower()
-        text = text.split()
-        text = [self.lemmatizer.lemmatize(word) for word in text if word not in self.stop_words]
-        return ' '.join(text)
+        return ' '.join(self.tokenize(text))
+
+    def tokenize(self, text):
+        """
+        Single pass version of clean_text returning the list of cleaned words
+        """
+        stop_words = self.stop_words
+        lemmatizer = self.lemmatizer
+        words = (word.lower() for word in _WORD_PATTERN.findall(text))
+        return [_lemmatize(lemmatizer, word) for word in words if word not in stop_words]
+
+    def encode(self, text, out=None):
+        """
+        Fused clean_text -> text_to_sequence -> pad_sequence for a single text
+        Writes the word indices into out (a zero padded row is created if None), stopping at max_len
+        """
+        if not isinstance(self.vocab, dict):
+            # Array backed vocabularies look the tokens up in one vectorized call
+            return self.encode_tokens(self.tokenize(text), out=out)
+        if out is None:
+            out = np.zeros(self.max_len, dtype=np.int64)
+
+        stop_words = self.stop_words
+        lemmatizer = self.lemmatizer
+        vocab_get = self.vocab.get
+        max_len = self.max_len
+        sequence = []
+        for match in _WORD_PATTERN.finditer(text):
+            word = match.group().lower()
+            if word in stop_words:
+                continue
+            sequence.append(vocab_get(_lemmatize(lemmatizer, word), 0))
+            if len(sequence) == max_len:
+                break
+
+        out[:len(sequence)] = sequence
+        out[len(sequence):] = 0
+        return out
     
     def build_vocab(self, train_texts):
         """
@@ -69,6 +152,19 @@ class TextPreprocessor:
         # Build vocabulary
         self.build_vocab(train_texts)
         
+    def encode_tokens(self, tokens, out=None):
+        """
+        text_to_sequence -> pad_sequence for already cleaned tokens (see tokenize)
+        Writes the word indices into out (a zero padded row is created if None)
+        """
+        if out is None:
+            out = np.zeros(self.max_len, dtype=np.int64)
+
+        sequence = lookup_ids(self.vocab, tokens[:self.max_len])
+        out[:len(sequence)] = sequence
+        out[len(sequence):] = 0
+        return out
+
     def process(self, text):
         """
         Process a single text for inference
@@ -77,21 +173,68 @@ class TextPreprocessor:
         if not self.vocab:
             raise ValueError("Vocabulary not built. Call fit() first.")
             
-        # Clean the text
-        cleaned_text = self.clean_text(text)
-        # Convert to sequence
-        sequence = self.text_to_sequence(cleaned_text)
-        # Pad sequence
-        padded_sequence = self.pad_sequence(sequence)
+        # Clean, convert to sequence and pad in one pass
+        padded_sequence = self.encode(text)
         # Add batch dimension (model expects batch of sequences)
         return np.expand_dims(padded_sequence, axis=0)
 
+    def process_batch(self, texts):
+        """
+        Process a list of texts for inference
+        Returns: np.ndarray of shape (N, max_len) ready for model input
+        """
+        if not self.vocab:
+            raise ValueError("Vocabulary not built. Call fit() first.")
+
+        batch = np.zeros((len(texts), self.max_len), dtype=np.int64)
+        for i, text in enumerate(texts):
+            self.encode(text, out=batch[i])
+        return batch
+
+# Tokens that hint at transliterated (romanized) Hindi/Urdu text
+_TRANSLIT_MARKERS = frozenset({'nahi', 'hai', 'ka', 'kya', 'zindagi', 'tum', 'mera'})
+_LETTER_PATTERN = re.compile(r'[a-zA-Z]')
+_DIGIT_PATTERN = re.compile(r'\d')
+
+def _is_latin_char(char):
+    """
+    Check if a character belongs to the Latin script (by its unicode name)
+    """
+    try:
+        return 'LATIN' in unicodedata.name(char)
+    except ValueError:
+        return False
+
+@lru_cache(maxsize=None)
+def _latin_table():
+    """
+    Lookup table over the BMP : 1 where the code point is a Latin character, else 0
+    Built once on first use, code points above the BMP fall back to _is_latin_char
+    """
+    table = bytearray(0x10000)
+    for code in range(0x10000):
+        if _is_latin_char(chr(code)):
+            table[code] = 1
+    return np.frombuffer(bytes(table), dtype=np.uint8)
+
+def _latin_count(text):
+    """
+    Number of Latin characters in the text
+    """
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    bmp = codes < 0x10000
+    count = int(_latin_table()[codes[bmp]].sum())
+    if not bmp.all():
+        count += sum(1 for code in codes[~bmp] if _is_latin_char(chr(code)))
+    return count
+
 class DriftDetector:
     def __init__(self, preprocessor, contamination=0.05, random_state=42):
         """
         preprocessor: Fitted TextPreprocessor
         contamination: Expected proportion of drifted samples
         """
+        from sklearn.ensemble import IsolationForest
         self.preprocessor = preprocessor
         self.model = IsolationForest(contamination=contamination, random_state=random_state)
         self.fitted = False
@@ -100,38 +243,55 @@ class DriftDetector:
         """
         Check if a character belongs to the Latin script.
         """
-        try:
-            return 'LATIN' in unicodedata.name(char)
-        except ValueError:
-            return False
+        code = ord(char)
+        if code < 0x10000:
+            return bool(_latin_table()[code])
+        return _is_latin_char(char)
 
     def extract_features(self, text):
         """
         Extracting the features to fit isolation forest
         """
-        cleaned = self.preprocessor.clean_text(text)
-        tokens = cleaned.split()
+        tokens = self.preprocessor.tokenize(text)
+        return np.array(self._features(text, tokens))
 
+    def extract_features_many(self, texts):
+        """
+        Extracting the features for a batch of texts
+        Returns: np.ndarray of shape (N, 5)
+        """
+        features = [self._features(text, self.preprocessor.tokenize(text)) for text in texts]
+        return np.array(features, dtype=np.float64).reshape(len(texts), 5)
+
+    def _features(self, text, tokens, ids=None):
+        """
+        Feature vector (as a list) from the raw text and its cleaned tokens
+        ids: Optional vocabulary ids of all the tokens (0 = unknown) when already looked up
+        """
         if not tokens:
-            return np.array([1.0, 0.0, 1.0, 0.0, 0.0])  # Edge case: empty
+            return [1.0, 0.0, 1.0, 0.0, 0.0]  # Edge case: empty
 
+        n_tokens = len(tokens)
         # Feature 1: OOV ratio
-        oov_ratio = sum(1 for t in tokens if t not in self.preprocessor.vocab) / len(tokens)
+        if ids is None:
+            vocab = self.preprocessor.vocab
+            oov_ratio = sum(1 for t in tokens if t not in vocab) / n_tokens
+        else:
+            oov_ratio = int(np.count_nonzero(ids == 0)) / n_tokens
         # Feature 2: Average word length
-        avg_word_len = np.mean([len(t) for t in tokens])
+        avg_word_len = sum(map(len, tokens)) / n_tokens
         # Feature 3: Non-Latin character ratio (using raw text)
         raw = text.strip()
-        non_latin_ratio = sum(1 for c in raw if not self._is_latin(c)) / len(raw) if raw else 0
+        non_latin_ratio = (len(raw) - _latin_count(raw)) / len(raw) if raw else 0
         # Feature 4: Transliteration-like token frequency
-        translit_markers = {'nahi', 'hai', 'ka', 'kya', 'zindagi', 'tum', 'mera'}
-        translit_score = sum(1 for t in tokens if t in translit_markers) / len(tokens)
+        translit_score = sum(1 for t in tokens if t in _TRANSLIT_MARKERS) / n_tokens
         # Feature 5: Mixed alphanumeric token ratio
-        mixed_token_ratio = sum(1 for t in tokens if re.search(r'[a-zA-Z]', t) and re.search(r'\d', t)) / len(tokens)
+        mixed_token_ratio = sum(1 for t in tokens if _LETTER_PATTERN.search(t) and _DIGIT_PATTERN.search(t)) / n_tokens
 
-        return np.array([oov_ratio, avg_word_len, non_latin_ratio, translit_score, mixed_token_ratio])
+        return [oov_ratio, avg_word_len, non_latin_ratio, translit_score, mixed_token_ratio]
 
     def fit(self, train_texts):
-        features = np.array([self.extract_features(text) for text in train_texts])
+        features = self.extract_features_many(train_texts)
         self.model.fit(features)
         self.fitted = True
 
@@ -142,6 +302,30 @@ class DriftDetector:
         features = self.extract_features(text).reshape(1, -1)
         return self.model.predict(features)[0] == -1  # -1 = drifted
 
+    def is_drifted_many(self, texts):
+        """
+        Drift check for a batch of texts with a single predict call
+        Returns: boolean np.ndarray of shape (N,)
+        """
+        if not self.fitted:
+            raise RuntimeError("DriftDetector must be fitted first.")
+
+        if len(texts) == 0:
+            return np.zeros(0, dtype=bool)
+        return self.is_drifted_features(self.extract_features_many(texts))
+
+    def is_drifted_features(self, features):
+        """
+        Drift check for an (N, 5) array of already extracted features
+        Returns: boolean np.ndarray of shape (N,)
+        """
+        if not self.fitted:
+            raise RuntimeError("DriftDetector must be fitted first.")
+
+        if len(features) == 0:
+            return np.zeros(0, dtype=bool)
+        return self.model.predict(features) == -1  # -1 = drifted
+
     def save(self, path):
         with open(path, 'wb') as f:
             pickle.dump(self, f)
@@ -150,3 +334,791 @@ class DriftDetector:
     def load(path):
         with open(path, 'rb') as f:
             return pickle.load(f)
+
+
+def lookup_ids(vocab, tokens):
+    """
+    Vocabulary ids of the tokens, 0 for unknown words (a dict or a CompactVocab)
+    Returns: np.ndarray int64 of shape (len(tokens),)
+    """
+    if isinstance(vocab, CompactVocab):
+        return vocab.lookup(tokens)
+    vocab_get = vocab.get
+    return np.fromiter((vocab_get(token, 0) for token in tokens), dtype=np.int64, count=len(tokens))
+
+# Multipliers of the 8 byte words of a key in the CompactVocab hash (odd 64 bit constants)
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+                              0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9],
+                             dtype=np.uint64)
+_MIX_SHIFTS = (np.uint64(30), np.uint64(27), np.uint64(31))
+_MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+def _hash_keys(keys):
+    """
+    64 bit hash of each fixed width byte key (width a multiple of 8, at most 64 bytes)
+    """
+    words = keys.view('<u8').reshape(len(keys), -1)
+    hashes = words @ _HASH_MULTIPLIERS[:words.shape[1]]
+    # splitmix64 finalizer, so that the low bits used as slot depend on every byte
+    hashes ^= hashes >> _MIX_SHIFTS[0]
+    hashes *= _MIX_MULTIPLIERS[0]
+    hashes ^= hashes >> _MIX_SHIFTS[1]
+    hashes *= _MIX_MULTIPLIERS[1]
+    hashes ^= hashes >> _MIX_SHIFTS[2]
+    return hashes
+
+class CompactVocab:
+    def __init__(self, words, ids, table, max_probes, long_words):
+        """
+        Read-only word -> id mapping on contiguous arrays (see save_compact), usable memory mapped
+        words: Fixed width byte strings (np.ndarray 'S<width>', width a multiple of 8)
+        ids: Ids of the words, same order (np.ndarray int32)
+        table: Open addressing hash table (power of 2 size) of indices into words, -1 for empty slots
+        max_probes: Longest linear probe sequence in the table
+        long_words: Dict for the few words longer than the width
+        """
+        self.words = words
+        self.ids = ids
+        self.table = table
+        self.max_probes = max_probes
+        self.long_words = long_words
+        self.width = words.dtype.itemsize
+        self.mask = np.uint64(len(table) - 1)
+
+    @staticmethod
+    def build_table(words):
+        """
+        Hash table of the word indices, four times as many slots as words (short probe sequences)
+        Returns: (table np.ndarray int32, max_probes)
+        """
+        size = 1 << max(1, (4 * len(words) - 1).bit_length())
+        table = np.full(size, -1, dtype=np.int32)
+        max_probes = 1
+        for index, slot in enumerate((_hash_keys(words) & np.uint64(size - 1)).tolist()):
+            probes = 1
+            while table[slot] >= 0:
+                slot = (slot + 1) & (size - 1)
+                probes += 1
+            table[slot] = index
+            max_probes = max(max_probes, probes)
+        return table, max_probes
+
+    def lookup(self, tokens):
+        """
+        Ids of a list of words with vectorized hash probes, 0 for unknown words
+        """
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        try:
+            keys = np.array(tokens, dtype=self.words.dtype)
+            encoded = tokens
+        except UnicodeEncodeError:
+            encoded = [token.encode('utf-8') for token in tokens]
+            keys = np.array(encoded, dtype=self.words.dtype)
+
+        # First probe for all the keys, the few collisions continue along the table
+        slots = _hash_keys(keys) & self.mask
+        entries = self.table[slots]
+        ids = np.where(self.words[entries] == keys, self.ids[entries], 0).astype(np.int64)
+        ids[entries < 0] = 0
+        pending = np.flatnonzero((ids == 0) & (entries >= 0))
+        for _ in range(self.max_probes - 1):
+            if not len(pending):
+                break
+            slots[pending] = (slots[pending] + np.uint64(1)) & self.mask
+            entries = self.table[slots[pending]]
+            hits = (entries >= 0) & (self.words[entries] == keys[pending])
+            ids[pending[hits]] = self.ids[entries[hits]]
+            pending = pending[~hits & (entries >= 0)]
+
+        # Keys longer than the width were truncated, they are looked up in the dict instead
+        if max(map(len, encoded)) > self.width:
+            for i, token in enumerate(encoded):
+                if len(token) > self.width:
+                    ids[i] = self.long_words.get(tokens[i], 0)
+        return ids
+
+    def get(self, word, default=None):
+        word_id = int(self.lookup([word])[0])
+        return word_id if word_id else default
+
+    def __contains__(self, word):
+        return bool(self.lookup([word])[0])
+
+    def __len__(self):
+        return len(self.words) + len(self.long_words)
+
+    def __iter__(self):
+        """
+        Words in id order (most frequent first), as the dict vocabulary
+        """
+        pairs = [(int(word_id), word.decode('utf-8')) for word, word_id in zip(self.words, self.ids)]
+        pairs.extend((word_id, word) for word, word_id in self.long_words.items())
+        return (word for _, word in sorted(pairs))
+
+def _average_path_length(n_samples):
+    """
+    Average path length of an unsuccessful search in a binary search tree of n samples (as sklearn)
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    rest = n_samples > 2
+    lengths[n_samples == 2] = 1.0
+    lengths[rest] = (2.0 * (np.log(n_samples[rest] - 1.0) + np.euler_gamma)
+                     - 2.0 * (n_samples[rest] - 1.0) / n_samples[rest])
+    return lengths
+
+class FlatIsolationForest:
+    def __init__(self, left, right, feature, threshold, leaf_value, roots, offset, denominator, max_depth):
+        """
+        Isolation forest predictions on flat numpy arrays (nodes of all the trees concatenated)
+        left / right: Global index of the children, -1 at the leaves
+        feature / threshold: Split column (of the full feature vector) and threshold of each node
+        leaf_value: Path length term of each leaf (depth + average path length of its samples - 1)
+        roots: Index of the root of each tree
+        offset: offset_ of the fitted IsolationForest, denominator: trees * average path length of max_samples
+        """
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.offset_ = offset
+        self.denominator = denominator
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flattens a fitted sklearn IsolationForest
+        """
+        subsample_features = model._max_features != model.n_features_in_
+        left, right, feature, threshold, leaf_value, roots = [], [], [], [], [], []
+        base = 0
+        for i, (estimator, features) in enumerate(zip(model.estimators_, model.estimators_features_)):
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            left.append(np.where(is_leaf, -1, tree.children_left + base))
+            right.append(np.where(is_leaf, -1, tree.children_right + base))
+            columns = np.asarray(features)[np.maximum(tree.feature, 0)] if subsample_features else tree.feature
+            feature.append(np.where(is_leaf, 0, columns))
+            threshold.append(tree.threshold)
+            if hasattr(model, "_decision_path_lengths"):
+                path_lengths = model._decision_path_lengths[i]
+                average_lengths = model._average_path_length_per_tree[i]
+            else:
+                path_lengths = tree.compute_node_depths()
+                average_lengths = _average_path_length(tree.n_node_samples)
+            # Same per tree term as IsolationForest._compute_score_samples
+            leaf_value.append(path_lengths + average_lengths - 1.0)
+            roots.append(base)
+            base += tree.node_count
+
+        denominator = len(model.estimators_) * _average_path_length([model.max_samples_])[0]
+        return cls(np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+                   np.concatenate(feature).astype(np.int32), np.concatenate(threshold).astype(np.float64),
+                   np.concatenate(leaf_value).astype(np.float64), np.array(roots, dtype=np.int32),
+                   float(model.offset_), float(denominator),
+                   max(estimator.tree_.max_depth for estimator in model.estimators_))
+
+    def _leaf_values(self, X):
+        """
+        Leaf value reached in every tree : np.ndarray of shape (N, trees)
+        """
+        # Compared in float32 like the sklearn trees
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            inner = left >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(inner, np.where(go_left, left, self.right[nodes]), nodes)
+        return self.leaf_value[nodes]
+
+    def score_samples(self, X):
+        # Summed tree by tree in order (cumsum), as sklearn does
+        depths = np.cumsum(self._leaf_values(X), axis=1)[:, -1] if len(X) else np.zeros(0)
+        return -(2 ** (-depths / self.denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        """
+        1 for inliers, -1 for outliers (as IsolationForest.predict)
+        """
+        is_inlier = np.ones(len(X), dtype=int)
+        is_inlier[self.decision_function(X) < 0] = -1
+        return is_inlier
+
+# Files of the compact artifacts (see save_compact), meta.json is written last
+COMPACT_FORMAT_VERSION = 1
+COMPACT_ARRAYS = ("vocab_words", "vocab_ids", "vocab_table", "forest_left", "forest_right", "forest_feature",
+                  "forest_threshold", "forest_leaf_value", "forest_roots")
+
+def save_compact(processor, detector, directory, width=24):
+    """
+    Writes the preprocessor and the drift detector without pickle : the vocabulary as a fixed width byte
+    array with a hash table over it (words longer than width bytes in a json dict), the isolation forest as
+    flat arrays and the settings in meta.json. The detector has to use the same vocabulary and stop words
+    as the preprocessor. width is rounded up to a multiple of 8 bytes (at most 64).
+    """
+    if detector.preprocessor.vocab != processor.vocab or detector.preprocessor.stop_words != processor.stop_words:
+        raise ValueError("The drift detector was fitted with another vocabulary than the preprocessor")
+
+    width = min(64, -(-width // 8) * 8)
+    os.makedirs(directory, exist_ok=True)
+    entries = [(word.encode('utf-8'), word_id) for word, word_id in processor.vocab.items()]
+    short = [(word, word_id) for word, word_id in entries if len(word) <= width]
+    long_words = {word.decode('utf-8'): word_id for word, word_id in entries if len(word) > width}
+    words = np.array([word for word, _ in short], dtype=f"S{width}")
+    table, max_probes = CompactVocab.build_table(words)
+
+    forest = detector.model if isinstance(detector.model, FlatIsolationForest) \
+        else FlatIsolationForest.from_sklearn(detector.model)
+    arrays = {"vocab_words": words,
+              "vocab_ids": np.array([word_id for _, word_id in short], dtype=np.int32),
+              "vocab_table": table,
+              "forest_left": forest.left, "forest_right": forest.right, "forest_feature": forest.feature,
+              "forest_threshold": forest.threshold, "forest_leaf_value": forest.leaf_value,
+              "forest_roots": forest.roots}
+    for name in COMPACT_ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+    with open(os.path.join(directory, "vocab_long.json"), "w") as f:
+        json.dump(long_words, f)
+
+    meta = {"format": COMPACT_FORMAT_VERSION,
+            "max_len": processor.max_len,
+            "vocab_size": processor.vocab_size,
+            "stop_words": sorted(processor.stop_words),
+            "vocab_max_probes": max_probes,
+            "forest": {"offset": forest.offset_, "denominator": forest.denominator, "max_depth": forest.max_depth}}
+    tmp_path = os.path.join(directory, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+def load_compact(directory):
+    """
+    Loads the artifacts written by save_compact, the arrays are memory mapped (shared by the processes)
+    Returns: (TextPreprocessor, DriftDetector) sharing one vocabulary
+    """
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["format"] != COMPACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact artifact format {meta['format']}")
+    with open(os.path.join(directory, "vocab_long.json")) as f:
+        long_words = json.load(f)
+    arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+              for name in COMPACT_ARRAYS}
+
+    # Restored the way unpickling does, without running __init__
+    processor = TextPreprocessor.__new__(TextPreprocessor)
+    processor.lemmatizer = LazyLemmatizer()
+    processor.stop_words = set(meta["stop_words"])
+    processor.vocab = CompactVocab(arrays["vocab_words"], arrays["vocab_ids"], arrays["vocab_table"],
+                                   meta["vocab_max_probes"], long_words)
+    processor.vocab_size = meta["vocab_size"]
+    processor.max_len = meta["max_len"]
+
+    forest = meta["forest"]
+    detector = DriftDetector.__new__(DriftDetector)
+    detector.preprocessor = processor
+    detector.model = FlatIsolationForest(arrays["forest_left"], arrays["forest_right"], arrays["forest_feature"],
+                                         arrays["forest_threshold"], arrays["forest_leaf_value"],
+                                         arrays["forest_roots"], forest["offset"], forest["denominator"],
+                                         forest["max_depth"])
+    detector.fitted = True
+    return processor, detector
+
+def analyze_many(processor, detector, texts, stage_times=None):
+    """
+    Cleans and tokenizes every text once and derives both the drift features and the model input
+    processor: Fitted TextPreprocessor (model vocabulary)
+    detector: Fitted DriftDetector
+    stage_times: Optional dict, the seconds spent in 'preprocessing' (cleaning, tokens, ids) and
+                 'drift_features' are added to it
+    Returns: (features np.ndarray (N, 5), sequences np.ndarray (N, max_len) int64)
+    """
+    features = np.zeros((len(texts), 5), dtype=np.float64)
+    sequences = np.zeros((len(texts), processor.max_len), dtype=np.int64)
+    # With one vocabulary for both, the ids of the tokens of all texts are looked up in one call
+    # (model input and OOV ratio)
+    vocab = processor.vocab
+    max_len = processor.max_len
+    clock = time.perf_counter
+    start = clock()
+    token_lists = [processor.tokenize(text) for text in texts]
+    id_lists = [None] * len(texts)
+    if detector.preprocessor.vocab is vocab and texts:
+        all_ids = lookup_ids(vocab, [token for tokens in token_lists for token in tokens])
+        bounds = np.cumsum([0] + [len(tokens) for tokens in token_lists])
+        id_lists = [all_ids[bounds[i]:bounds[i + 1]] for i in range(len(texts))]
+    preprocessing = clock() - start
+    drift_features = 0.0
+    for i, (text, tokens, ids) in enumerate(zip(texts, token_lists, id_lists)):
+        start = clock()
+        features[i] = detector._features(text, tokens, ids)
+        extracted = clock()
+        if ids is None:
+            processor.encode_tokens(tokens, out=sequences[i])
+        else:
+            sequences[i, :min(len(ids), max_len)] = ids[:max_len]
+        preprocessing += clock() - extracted
+        drift_features += extracted - start
+
+    if stage_times is not None:
+        stage_times['preprocessing'] = stage_times.get('preprocessing', 0.0) + preprocessing
+        stage_times['drift_features'] = stage_times.get('drift_features', 0.0) + drift_features
+    return features, sequences
+
+# Score cutoffs of the risk buckets (same as risk_from_score in backend_app.py)
+RISK_THRESHOLDS = {'high': 0.5, 'medium': 0.3}
+
+def risk_buckets(scores):
+    """
+    Vectorized risk buckets of an array of model scores
+    Returns: np.ndarray of 'high' / 'medium' / 'low'
+    """
+    scores = np.asarray(scores)
+    return np.where(scores >= RISK_THRESHOLDS['high'], 'high',
+                    np.where(scores >= RISK_THRESHOLDS['medium'], 'medium', 'low'))
+
+class Overloaded(Exception):
+    """
+    Raised when the inference queue is full (admission control)
+    """
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=32, max_wait=0.002, workers=1, max_queue=None,
+                 queue_gauge=None, batch_size_metric=None, wait_metric=None):
+        """
+        batch_fn: Callable mapping a list of inputs to a list of results (same order)
+        max_batch_size: Inputs handed to batch_fn at once (a single larger request runs on its own)
+        max_wait: Seconds to wait for more inputs after the first one arrives
+        workers: Dedicated inference threads collecting and running batches
+        max_queue: Inputs allowed to wait in the queue, further submits raise Overloaded (None = unbounded)
+        queue_gauge: Optional prometheus Gauge set to the number of queued inputs
+        batch_size_metric: Optional prometheus Histogram/Summary observing realized batch sizes
+        wait_metric: Optional prometheus Histogram/Summary observing the seconds requests spent queued
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_gauge = queue_gauge
+        self.batch_size_metric = batch_size_metric
+        self.wait_metric = wait_metric
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = 0  # inputs waiting in the queue
+        self._threads = []
+
+    def submit(self, item):
+        """
+        Queue one input and return a Future resolving to its own result
+        """
+        future = Future()
+        inner = self.submit_many([item])
+        inner.add_done_callback(lambda f: _chain_result(f, future, lambda results: results[0]))
+        return future
+
+    def submit_many(self, items):
+        """
+        Queue a request of several inputs, kept in one batch
+        Returns a Future resolving to the list of their results
+        Raises Overloaded when the queue cannot take them
+        """
+        with self._lock:
+            if self.max_queue is not None and self._queued + len(items) > self.max_queue:
+                raise Overloaded(f"Inference queue full ({self._queued} of {self.max_queue} inputs queued)")
+            self._queued += len(items)
+        self._ensure_workers()
+        future = Future()
+        self._queue.put((list(items), future, time.monotonic()))
+        self._report_depth()
+        return future
+
+    def queued(self):
+        return self._queued
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name="inference", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _report_depth(self):
+        if self.queue_gauge is not None:
+            self.queue_gauge.set(self._queued)
+
+    def _take(self, request):
+        """
+        Bookkeeping when a request leaves the queue
+        """
+        items, _, enqueued = request
+        with self._lock:
+            self._queued -= len(items)
+        if self.wait_metric is not None:
+            self.wait_metric.observe(time.monotonic() - enqueued)
+        return request
+
+    def _collect(self, carry):
+        """
+        Block for the first request, then gather more until the batch is full or max_wait passes
+        Returns the batch and the request held back for the next one (carry)
+        """
+        first = carry if carry is not None else self._take(self._queue.get())
+        batch, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request = self._take(request)
+            if size + len(request[0]) > self.max_batch_size:
+                self._report_depth()
+                return batch, request
+            batch.append(request)
+            size += len(request[0])
+        self._report_depth()
+        return batch, None
+
+    def _run(self):
+        carry = None
+        while True:
+            batch, carry = self._collect(carry)
+            # Requests cancelled while queued (client gone) are not run, the others cannot be cancelled anymore
+            batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for request_items, _, _ in batch for item in request_items]
+            if self.batch_size_metric is not None:
+                self.batch_size_metric.observe(len(items))
+
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                self._complete(batch, error=e)
+                continue
+            self._complete(batch, results)
+
+    def _complete(self, batch, results=None, error=None):
+        """
+        Resolves the futures of a batch, a future that cannot be resolved stops neither the others nor the worker
+        """
+        start = 0
+        for request_items, future, _ in batch:
+            try:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(list(results[start:start + len(request_items)]))
+            except Exception as e:
+                logger.error("Inference result of %d inputs not delivered : %r", len(request_items), e)
+            start += len(request_items)
+
+def _chain_result(source, target, transform):
+    """
+    Completes the target future from the source one
+    """
+    if target.cancelled() or source.cancelled():
+        target.cancel()
+        return
+    try:
+        error = source.exception()
+        if error is not None:
+            target.set_exception(error)
+        else:
+            target.set_result(transform(source.result()))
+    except InvalidStateError:
+        # Cancelled by its caller in the meantime
+        pass
+
+def artifact_fingerprint(paths):
+    """
+    (path, mtime, size) of each artifact file, changes when any of them is replaced
+    """
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+class PredictionCache:
+    def __init__(self, name, max_size=10000, ttl=3600.0, events_counter=None, size_gauge=None):
+        """
+        LRU cache with a time to live. The values depend on the artifacts loaded at startup and are only
+        invalidated by a restart (which a model or pickle swap needs anyway, nothing is reloaded at runtime)
+        name: Label of the cache in the metrics
+        max_size: Entries kept before the least recently used is evicted (0 disables the cache)
+        ttl: Seconds an entry stays valid
+        events_counter: Optional prometheus Counter with 'cache' and 'event' labels (hit / miss / eviction)
+        size_gauge: Optional prometheus Gauge with a 'cache' label set to the number of entries
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.events_counter = events_counter
+        self.size_gauge = size_gauge
+
+        self._entries = OrderedDict()  # key -> (value, expiry time)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Cached value for the key, None on a miss
+        """
+        if self.max_size <= 0:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._count("hit")
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+                self._count("eviction")
+            self._count("miss")
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._count("eviction")
+            self._report_size()
+
+    def _count(self, event):
+        if self.events_counter is not None:
+            self.events_counter.labels(cache=self.name, event=event).inc()
+
+    def _report_size(self):
+        if self.size_gauge is not None:
+            self.size_gauge.labels(cache=self.name).set(len(self._entries))
+
+# A file held by FileCache : contents, their base64 text, validators and the (mtime, size) version
+CachedFile = namedtuple('CachedFile', ['data', 'base64', 'etag', 'last_modified', 'mtime', 'version'])
+
+class FileCache:
+    def __init__(self, name, events_counter=None):
+        """
+        Small files (the visualization images) kept in memory with their HTTP validators,
+        reloaded when the modification time or the size of the file changes
+        name: Label of the cache in the metrics
+        events_counter: Optional prometheus Counter with 'cache' and 'event' labels (hit / miss / invalidation)
+        """
+        self.name = name
+        self.events_counter = events_counter
+        self._entries = {}  # path -> CachedFile
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Cached file, loaded on the first call and after a change on disk (one stat per call)
+        Raises FileNotFoundError when the file does not exist
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry.version == version:
+            self._count("hit")
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry.version != version:
+                self._count("miss" if entry is None else "invalidation")
+                with open(path, "rb") as f:
+                    data = f.read()
+                entry = CachedFile(data=data,
+                                   base64=base64.b64encode(data).decode("utf-8"),
+                                   etag='"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"',
+                                   last_modified=formatdate(stat.st_mtime, usegmt=True),
+                                   mtime=int(stat.st_mtime),
+                                   version=version)
+                self._entries[path] = entry
+        return entry
+
+    def _count(self, event):
+        if self.events_counter is not None:
+            self.events_counter.labels(cache=self.name, event=event).inc()
+
+def not_modified(entry, if_none_match=None, if_modified_since=None):
+    """
+    Whether a conditional GET can be answered with 304 (RFC 9110 : If-None-Match, weak comparison,
+    takes precedence over If-Modified-Since)
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == entry.etag for tag in tags)
+    if if_modified_since is not None:
+        try:
+            return entry.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def available_cpus():
+    """
+    CPUs this process may use : the cgroup CPU quota of the container if any, else the CPU affinity
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2 : "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            value, period = f.read().split()
+        if value != "max":
+            quota = int(value) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                value = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if value > 0:
+                quota = value / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, int(np.ceil(quota))))
+    return max(1, cpus)
+
+def build_session(model_path, intra_op_threads=0, inter_op_threads=1, execution_mode="sequential",
+                  graph_optimization_level="all", enable_cpu_mem_arena=True, enable_mem_pattern=True,
+                  optimized_model_path=None):
+    """
+    Creates the onnx runtime session from explicit options
+    intra_op_threads: Threads inside one operator, 0 means one per available CPU (container limit aware)
+    inter_op_threads: Threads across operators (only used by the parallel execution mode)
+    execution_mode: 'sequential' or 'parallel'
+    graph_optimization_level: 'disable', 'basic', 'extended' or 'all'
+    enable_cpu_mem_arena / enable_mem_pattern: Memory arena and memory pattern planning
+    optimized_model_path: Optional file for the optimized graph, written on the first start and
+                          loaded (without optimizing again) while model_path is unchanged
+    Returns: (session, dict of the applied settings)
+    """
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    modes = {
+        "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+        "parallel": ort.ExecutionMode.ORT_PARALLEL,
+    }
+    if graph_optimization_level not in levels:
+        raise ValueError(f"Unknown graph optimization level {graph_optimization_level!r}")
+    if execution_mode not in modes:
+        raise ValueError(f"Unknown execution mode {execution_mode!r}")
+
+    intra_op_threads = intra_op_threads or available_cpus()
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = modes[execution_mode]
+    options.enable_cpu_mem_arena = enable_cpu_mem_arena
+    options.enable_mem_pattern = enable_mem_pattern
+
+    load_path = model_path
+    # The optimized graph records the source it was made from (path, mtime, size)
+    source = repr(artifact_fingerprint([model_path]))
+    source_path = f"{optimized_model_path}.source"
+    cached = False
+    if optimized_model_path is not None and os.path.exists(optimized_model_path):
+        try:
+            with open(source_path) as f:
+                cached = f.read() == source
+        except OSError:
+            cached = False
+    if cached:
+        # Already optimized offline, loading it as is
+        load_path = optimized_model_path
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        options.graph_optimization_level = levels[graph_optimization_level]
+        if optimized_model_path is not None:
+            options.optimized_model_filepath = optimized_model_path
+
+    session = ort.InferenceSession(load_path, sess_options=options, providers=["CPUExecutionProvider"])
+    if optimized_model_path is not None and not cached:
+        with open(source_path, "w") as f:
+            f.write(source)
+    settings = {
+        "model_path": load_path,
+        "intra_op_threads": intra_op_threads,
+        "inter_op_threads": inter_op_threads,
+        "execution_mode": execution_mode,
+        "graph_optimization_level": "cached" if cached else graph_optimization_level,
+        "cpu_mem_arena": enable_cpu_mem_arena,
+        "mem_pattern": enable_mem_pattern,
+    }
+    return session, settings
+
+class StartupPhases:
+    """
+    Seconds spent in each startup phase, in order, mirrored to an optional gauge labelled by phase
+    """
+    def __init__(self, gauge=None):
+        self.phases = OrderedDict()
+        self.gauge = gauge
+
+    def record(self, name, seconds):
+        self.phases[name] = seconds
+        if self.gauge is not None:
+            self.gauge.labels(phase=name).set(seconds)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self):
+        return ', '.join(f"{name} {seconds:.3f} s" for name, seconds in self.phases.items())
+
+def warm_up(session, input_name, max_len, vocab_size, batch_sizes=(1, 8, 32), rounds=2, seed=0):
+    """
+    Runs the session on random sequences of each batch size so that the first requests
+    do not pay for the allocations
+    Returns: seconds spent warming up
+    """
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for batch_size in batch_sizes:
+        batch = rng.integers(1, max(2, vocab_size), size=(batch_size, max_len), dtype=np.int64)
+        for _ in range(rounds):
+            session.run(None, {input_name: batch})
+    return time.perf_counter() - start
@@ -1,24 +1,52 @@
 ## Backend script for the API calls ##
 
 # Importing the necessary libraries required #
+import asyncio
+import contextvars
 import logging
 import os
+import re
+import shutil
+import signal
+import socket
 import sys
 import time
-from fastapi import FastAPI, Body, Request
-from fastapi.responses import JSONResponse
+import uuid
+
+# Reference of the startup phase timings (see StartupPhases in Utils.py)
+STARTUP_STARTED = time.perf_counter()
+
+# Number of pre-forked worker processes serving the API (see serve_prefork)
+BACKEND_WORKERS = int(os.getenv('BACKEND_WORKERS', 1))
+if __name__ == "__main__" and BACKEND_WORKERS > 1:
+    # The metrics of all workers are aggregated through files, this has to be
+    # set up before prometheus_client is imported
+    multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc_backend')
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+from fastapi import FastAPI, Body, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from threading import Thread
-from prometheus_client import Summary, start_http_server, Counter, Gauge, Info
+from threading import Thread, Event
+from prometheus_client import Summary, start_http_server, Counter, Gauge, Info, Histogram
 from prometheus_client import disable_created_metrics
+from prometheus_client import CollectorRegistry, multiprocess
 import pickle
-import uvicorn
-import base64
+import hashlib
 import psycopg2
+from psycopg2.extras import execute_values
 import Utils
+import uvicorn
+from contextlib import asynccontextmanager
+from db_utils import ConnectionPool, WriteBehindWriter, QueueFull
+from log_utils import log_path, read_log_range, read_log_tail, follow_log
+# log_pipeline.py is shared with the frontend : next to the app in the image, in COMMON_ in the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "COMMON_"))
+from log_pipeline import setup_logging, parse_sample_rates, LogSampler, log_sampled
 import numpy as np
-import onnxruntime as ort
 
 
 # Creating useful prometheus metrics
@@ -29,6 +57,46 @@ disable_created_metrics()
 request_size = Summary('input_bytes_be', 'input data size (bytes)') 
 # _sum tracks total time taken, _count tracks number of calls
 api_usage = Summary('api_runtime_be', 'api run time monitoring')
+# micro-batching of concurrent /predict calls : pending inputs and realized batch sizes
+predict_queue_depth = Gauge('predict_queue_depth_be', 'number of /predict inputs waiting to be batched',
+                            multiprocess_mode='livesum')
+predict_batch_size = Histogram('predict_batch_size_be', 'number of /predict inputs scored per onnx call',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+# database connection pool : wait for a free connection and pool usage
+db_pool_wait = Summary('db_pool_wait_secs_be', 'time waited for a pooled database connection')
+db_pool_connections = Gauge('db_pool_connections_be', 'pooled database connections', ['state'],
+                            multiprocess_mode='livesum')
+db_pool_utilization = Gauge('db_pool_utilization_be', 'fraction of the pool size in use', multiprocess_mode='livemax')
+# write-behind of feedback / diagnostic rows : pending rows, flush time, rows per flush, rows not written
+db_write_queue_length = Gauge('db_write_queue_length_be', 'rows waiting to be written to the database',
+                              multiprocess_mode='livesum')
+db_flush_latency = Summary('db_flush_secs_be', 'time taken by one batched database write')
+db_rows_per_flush = Histogram('db_rows_per_flush_be', 'rows written per batched database write',
+                              buckets=(1, 5, 10, 50, 100, 250, 500, 1000))
+db_rows_dropped = Counter('db_rows_dropped_be', 'rows not written to the database', ['reason'])
+# prediction caches (drift verdicts and model scores) : hit / miss / eviction and entries
+prediction_cache_events = Counter('prediction_cache_events_be', 'prediction cache events', ['cache', 'event'])
+prediction_cache_size = Gauge('prediction_cache_entries_be', 'entries held in the prediction cache', ['cache'],
+                              multiprocess_mode='livesum')
+# in-memory file cache of the visualization images : hit / miss / invalidation (reload after a change on disk)
+file_cache_events = Counter('file_cache_events_be', 'file cache events', ['cache', 'event'])
+# admission control of the inference queue : time spent queued and rejected requests
+inference_queue_wait = Histogram('inference_queue_wait_secs_be', 'time inference requests wait in the queue',
+                                 buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+inference_rejected = Counter('inference_rejected_be', 'inference requests rejected with 429', ['endpoint'])
+# latency per endpoint (request id as exemplar) and per stage of the request path
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+request_latency = Histogram('request_latency_secs_be', 'latency of the API calls per endpoint', ['endpoint'],
+                            buckets=LATENCY_BUCKETS)
+stage_latency = Histogram('stage_latency_secs_be', 'time spent per stage (preprocessing, drift_features, '
+                          'isolation_forest, inference per batch ; db_connect, db_insert per call)', ['stage'],
+                          buckets=LATENCY_BUCKETS)
+# logging pipeline : records dropped because the queue of the log writer was full
+log_records_dropped = Counter('log_records_dropped_be', 'log records dropped (log writer queue full)')
+startup_phase_secs = Gauge('startup_phase_secs_be', 'seconds spent per startup phase (imports, artifacts, session, '
+                           'session_warmup, db_pool, predict_warmup)', ['phase'], multiprocess_mode='livemax')
+startup = Utils.StartupPhases(gauge=startup_phase_secs)
+startup.record("imports", time.perf_counter() - STARTUP_STARTED)
 
 # define the counter to track the usage based on client IP.
 api_counter = Counter('api_call_counter_be', 'number of times that API is called', ['endpoint', 'client'])
@@ -36,13 +104,53 @@ api_gauge = Gauge('api_runtime_secs_be', 'runtime of the method in seconds', ['e
 
 # adding build information to the info metric.
 info = Info('my_build', 'Prometheus Instrumented AI App for Suicide Detection')
-info.info({'version': '0.0.1', 'buildhost': '@Instinct', 'author': 'Joel J @ IITM', 'builddate': 'April 2025'})
-
-# Creating onnx runtime session
-session = ort.InferenceSession("/var/Data_/model_best.onnx")
+build_info = {'version': '0.0.1', 'buildhost': '@Instinct', 'author': 'Joel J @ IITM', 'builddate': 'April 2025'}
+info.info(build_info)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Opening the database connection pool and starting the buffered writer
+    with startup.phase("db_pool"):
+        db_pool.open()
+        db_writer.start()
+    # Warming up the predict path in the background, /ready turns green once it is done
+    Thread(target=warm_up_predict_path, daemon=True).start()
+    yield
+    # Draining the pending rows before the pool goes away
+    db_writer.stop()
+    db_pool.close()
 
 # create the AI application
-app = FastAPI(title="AI Application for Suicide Detection (via text)")
+app = FastAPI(title="AI Application for Suicide Detection (via text)", lifespan=lifespan)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Tags the request with its id (log lines and X-Request-ID response header) and observes its latency
+    """
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    sampled_token = log_sampled.set(log_sampler.sample(request.scope["path"]))
+    try:
+        start = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+
+        # Route template, so that path parameters do not create new label values
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        request_latency.labels(endpoint=endpoint).observe(elapsed, exemplar={'trace_id': request_id})
+        logger.info("%s %s -> %d in %.1f ms", request.method, request.scope["path"], response.status_code,
+                    elapsed * 1000)
+
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        log_sampled.reset(sampled_token)
+        request_id_var.reset(token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -50,16 +158,34 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# Setting up the logging 
+# Id of the request being served, sent by the frontend as X-Request-ID (or created here)
+request_id_var = contextvars.ContextVar('request_id', default='-')
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+# Setting up the logging : records queued on the request path and written as JSON lines (LOG_FORMAT=text
+# for the plain format) by a background thread to the rotated log file and stdout. LOG_SAMPLE_RATES keeps
+# the DEBUG / INFO lines of a fraction of the requests per path prefix ("/predict=0.1,/logs=0")
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_ROTATE_BYTES = int(os.getenv('LOG_ROTATE_BYTES', 10 * 1024 * 1024))
+LOG_ROTATE_SECS = float(os.getenv('LOG_ROTATE_SECS', 0))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 3))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+LOG_SAMPLE_DEFAULT = float(os.getenv('LOG_SAMPLE_DEFAULT', 1))
+# Opt-in : no caller / thread / process lookups per record, for every logger of the process
+LOG_LEAN_RECORDS = os.getenv('LOG_LEAN_RECORDS', '0') == '1'
 log_file = "/var/log/backend.log"
-logging.basicConfig(
-    level = logging.DEBUG,
-    format = "%(asctime)s - %(levelname)s - %(message)s",
-    handlers = [
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+log_writer = setup_logging(log_file, request_id_var,
+                           level=LOG_LEVEL,
+                           fmt=LOG_FORMAT,
+                           rotate_bytes=LOG_ROTATE_BYTES,
+                           rotate_secs=LOG_ROTATE_SECS,
+                           backup_count=LOG_BACKUP_COUNT,
+                           queue_size=LOG_QUEUE_SIZE,
+                           lean_records=LOG_LEAN_RECORDS,
+                           dropped_counter=log_records_dropped)
+log_sampler = LogSampler(LOG_SAMPLE_RATES, LOG_SAMPLE_DEFAULT)
 logger = logging.getLogger(__name__)
 
 logger.info("The Backend is starting now !!!")
@@ -71,6 +197,56 @@ try:
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'postgres')
     POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'postgres_db')
     POSTGRES_PORT = int(os.getenv('POSTGRES_PORT', 5432))
+    # Upper bound on the number of texts scored in one /predict_batch call
+    PREDICT_BATCH_MAX = int(os.getenv('PREDICT_BATCH_MAX', 256))
+    # Coalescing of concurrent /predict calls (largest batch and longest wait for it)
+    PREDICT_MAX_BATCH_SIZE = int(os.getenv('PREDICT_MAX_BATCH_SIZE', 32))
+    PREDICT_MAX_WAIT_MS = float(os.getenv('PREDICT_MAX_WAIT_MS', 2))
+    # Dedicated inference threads, inputs allowed to queue for them before answering 429,
+    # and the Retry-After (seconds) sent with the 429
+    INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 1))
+    INFERENCE_MAX_QUEUE = int(os.getenv('INFERENCE_MAX_QUEUE', 1024))
+    INFERENCE_RETRY_AFTER = int(os.getenv('INFERENCE_RETRY_AFTER', 1))
+    # Database connection pool bounds, wait timeout and idle health-check age (seconds)
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 2))
+    DB_POOL_IDLE_CHECK = float(os.getenv('DB_POOL_IDLE_CHECK', 30))
+    # Write-behind of the feedback / diagnostic rows : memory bound, flush thresholds and
+    # backpressure policy once full (block, reject or drop_oldest)
+    WRITE_BEHIND_MAX_QUEUE = int(os.getenv('WRITE_BEHIND_MAX_QUEUE', 10000))
+    WRITE_BEHIND_FLUSH_ROWS = int(os.getenv('WRITE_BEHIND_FLUSH_ROWS', 500))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 1))
+    WRITE_BEHIND_POLICY = os.getenv('WRITE_BEHIND_POLICY', 'block')
+    # Prediction caches : entries per cache (0 disables) and time to live (seconds)
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 10000))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+    # onnx runtime session profile (0 intra-op threads = one per CPU allowed to the container),
+    # optional file caching the optimized graph and batch sizes run at startup to warm up
+    ORT_INTRA_OP_THREADS = int(os.getenv('ORT_INTRA_OP_THREADS', 0))
+    ORT_INTER_OP_THREADS = int(os.getenv('ORT_INTER_OP_THREADS', 1))
+    ORT_EXECUTION_MODE = os.getenv('ORT_EXECUTION_MODE', 'sequential')
+    ORT_GRAPH_OPT_LEVEL = os.getenv('ORT_GRAPH_OPT_LEVEL', 'all')
+    ORT_CPU_MEM_ARENA = os.getenv('ORT_CPU_MEM_ARENA', '1') == '1'
+    ORT_MEM_PATTERN = os.getenv('ORT_MEM_PATTERN', '1') == '1'
+    ORT_OPTIMIZED_MODEL_PATH = os.getenv('ORT_OPTIMIZED_MODEL_PATH') or None
+    ORT_WARMUP_BATCH_SIZES = [int(n) for n in os.getenv('ORT_WARMUP_BATCH_SIZES', '1,8,32').split(',') if n]
+    # Model artifact loaded by the session : full precision (fp32) or dynamically quantized (int8,
+    # see quantize_model.py), MODEL_PATH overrides the file of the variant
+    MODEL_VARIANTS = {'fp32': '/var/Data_/model_best.onnx', 'int8': '/var/Data_/model_best_int8.onnx'}
+    MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'fp32')
+    MODEL_PATH = os.getenv('MODEL_PATH') or MODEL_VARIANTS[MODEL_VARIANT]
+    # Pickle-free preprocessor / drift detector written by convert_artifacts.py, used when present
+    COMPACT_ARTIFACTS_DIR = os.getenv('COMPACT_ARTIFACTS_DIR', '/var/Data_/compact')
+    # Cache-Control max-age (seconds) of the raw visualization images, revalidated with their ETag after
+    VISUALIZATIONS_MAX_AGE = int(os.getenv('VISUALIZATIONS_MAX_AGE', 60))
+    # Log retrieval : lines returned without a range, largest range read per call (bytes),
+    # and the follow stream polling interval, idle heartbeat and duration before the client reconnects (seconds)
+    LOGS_DEFAULT_TAIL_LINES = int(os.getenv('LOGS_DEFAULT_TAIL_LINES', 1000))
+    LOGS_MAX_BYTES = int(os.getenv('LOGS_MAX_BYTES', 1024 * 1024))
+    LOGS_FOLLOW_INTERVAL = float(os.getenv('LOGS_FOLLOW_INTERVAL', 0.5))
+    LOGS_FOLLOW_HEARTBEAT = float(os.getenv('LOGS_FOLLOW_HEARTBEAT', 15))
+    LOGS_FOLLOW_MAX_SECS = float(os.getenv('LOGS_FOLLOW_MAX_SECS', 300))
     logging.info("Setting up the environment variables successful")
 
 except Exception as e:
@@ -82,6 +258,9 @@ except Exception as e:
 class input_data(BaseModel):
     text : str
 
+class input_batch(BaseModel):
+    texts : List[str]
+
 class input_feedback(BaseModel):
     rating : int
     comments : str
@@ -109,10 +288,71 @@ def load_detector(filename):
     return loaded_detector
 
 # Global loading of model and processor
-from Utils import TextPreprocessor, DriftDetector
-processor = TextPreprocessor()
-processor = load_preprocessor(filename="/var/Data_/preprocess_obj_numpy.pkl")
-detector = load_detector(filename="/var/Data_/drift_uni_obj.pkl")
+from Utils import TextPreprocessor, DriftDetector, MicroBatcher, PredictionCache, analyze_many, artifact_fingerprint
+from Utils import build_session, warm_up, Overloaded, FlatIsolationForest, load_compact, missing_nltk_data
+from Utils import FileCache, not_modified
+COMPACT_META_PATH = os.path.join(COMPACT_ARTIFACTS_DIR, "meta.json")
+# Artifacts behind the predictions. Nothing is reloaded at runtime : a model or pickle swap, and with it the
+# invalidation of the prediction caches, takes a restart. Their version is captured before they are loaded
+# to detect a worker started on swapped files (see load_session)
+ARTIFACT_PATHS = [MODEL_PATH,
+                  "/var/Data_/preprocess_obj_numpy.pkl",
+                  "/var/Data_/drift_uni_obj.pkl",
+                  COMPACT_META_PATH]
+LOADED_ARTIFACTS = artifact_fingerprint(ARTIFACT_PATHS)
+with startup.phase("artifacts"):
+    if os.path.exists(COMPACT_META_PATH):
+        # Memory mapped arrays, shared by the pre-forked workers through the page cache
+        # (nltk is only imported by the first lemmatization, during the predict path warm-up)
+        logger.info("Loading the compact preprocessor and detector from %s", COMPACT_ARTIFACTS_DIR)
+        processor, detector = load_compact(COMPACT_ARTIFACTS_DIR)
+    else:
+        # Unpickling imports nltk and sklearn, which the pickled objects reference
+        processor = load_preprocessor(filename="/var/Data_/preprocess_obj_numpy.pkl")
+        detector = load_detector(filename="/var/Data_/drift_uni_obj.pkl")
+        # The detector pickle holds its own copy of the preprocessor, one shared vocabulary lets
+        # analyze_many look the tokens up once
+        if detector.preprocessor.vocab == processor.vocab and detector.preprocessor.stop_words == processor.stop_words:
+            detector.preprocessor = processor
+        # Same predictions as the sklearn forest (see convert_artifacts.py) without its per call overhead
+        detector.model = FlatIsolationForest.from_sklearn(detector.model)
+
+def load_session():
+    """
+    Creates and warms up the onnx runtime session (sets the global session)
+    """
+    global session
+    logger.info("Creating the onnx runtime session")
+    # A worker forked later reads the model file again, it no longer matches the loaded pickles once swapped
+    if artifact_fingerprint(ARTIFACT_PATHS) != LOADED_ARTIFACTS:
+        logger.warning("Model or pickle files changed on disk since startup, restart the backend to serve them")
+    # Workers share the CPUs unless the thread count is set explicitly
+    intra_op_threads = ORT_INTRA_OP_THREADS or max(1, Utils.available_cpus() // BACKEND_WORKERS)
+    with startup.phase("session"):
+        session, session_settings = build_session(MODEL_PATH,
+                                                  intra_op_threads=intra_op_threads,
+                                                  inter_op_threads=ORT_INTER_OP_THREADS,
+                                                  execution_mode=ORT_EXECUTION_MODE,
+                                                  graph_optimization_level=ORT_GRAPH_OPT_LEVEL,
+                                                  enable_cpu_mem_arena=ORT_CPU_MEM_ARENA,
+                                                  enable_mem_pattern=ORT_MEM_PATTERN,
+                                                  optimized_model_path=ORT_OPTIMIZED_MODEL_PATH)
+    warmup_secs = warm_up(session, "input", processor.max_len, processor.vocab_size, ORT_WARMUP_BATCH_SIZES)
+    startup.record("session_warmup", warmup_secs)
+    logger.info("onnx runtime session %s warmed up in %.3f s", session_settings, warmup_secs)
+
+    # Reporting the chosen session settings and the warm-up time with the build information
+    info.info({**build_info,
+               **{f"ort_{key}": str(value) for key, value in session_settings.items()},
+               'ort_warmup_batch_sizes': ','.join(map(str, ORT_WARMUP_BATCH_SIZES)),
+               'ort_warmup_secs': f"{warmup_secs:.3f}",
+               'model_variant': MODEL_VARIANT,
+               'workers': str(BACKEND_WORKERS)})
+
+# Creating onnx runtime session (in the pre-fork mode the master validates the model,
+# reports the settings and releases it, each worker then creates its own after the fork)
+session = None
+load_session()
 
 def connect_to_db(use_env = True):
     """
@@ -124,20 +364,20 @@ def connect_to_db(use_env = True):
         conn = None
         try:
             logging.info("Connecting to the database ...")
-            conn = psycopg2.connect(dbname = POSTGRES_DB,
-                                    user = POSTGRES_USER, 
-                                    password = POSTGRES_PASSWORD,
-                                    host = POSTGRES_HOST, 
-                                    port = POSTGRES_PORT)
+            with stage_latency.labels(stage="db_connect").time():
+                conn = psycopg2.connect(dbname = POSTGRES_DB,
+                                        user = POSTGRES_USER, 
+                                        password = POSTGRES_PASSWORD,
+                                        host = POSTGRES_HOST, 
+                                        port = POSTGRES_PORT)
         except psycopg2.OperationalError as e:
-            logging.error(f"Error in connecting to the database {e}")
-            print(f"Error in connecting to the database {e}")
-            sys.exit(1)
+            # Surfaced to the caller (503) instead of terminating the backend
+            logging.error("Error in connecting to the database %s", e)
+            raise
 
         if conn is None:
             logging.error("Error in connecting to the database")
-            print("Error in connecting to the database")
-            sys.exit(1)
+            raise psycopg2.OperationalError("Error in connecting to the database")
 
         return conn
 
@@ -147,108 +387,276 @@ def connect_to_db(use_env = True):
         sys.exit(1)
 
         return None
-    
-def insert_to_db_feedback(conn, json):
+
+# Pooled connections shared by the write endpoints (opened at startup)
+db_pool = ConnectionPool(connect_to_db,
+                         min_size=DB_POOL_MIN_SIZE,
+                         max_size=DB_POOL_MAX_SIZE,
+                         wait_timeout=DB_POOL_WAIT_TIMEOUT,
+                         idle_check_after=DB_POOL_IDLE_CHECK,
+                         wait_metric=db_pool_wait,
+                         connections_gauge=db_pool_connections,
+                         utilization_gauge=db_pool_utilization)
+
+def insert_to_db_feedback(conn, rows):
+    """
+    Multi-row insert of (rating, comments) rows into the feedback table
+    Raises on failure so that the write-behind writer keeps the rows for retry
+    """
     cursor = conn.cursor()
 
     try: 
-        cursor.execute(
-            """ INSERT INTO feedback (rating, text_message)
-            VALUES (%s, %s)
-            """,
-            (json.rating, json.comments)
-        )
-
-        logger.info("Insertion of the row is successful")
-        if cursor.rowcount > 0:
+        with stage_latency.labels(stage="db_insert").time():
+            execute_values(
+                cursor,
+                "INSERT INTO feedback (rating, text_message) VALUES %s",
+                rows,
+                page_size = len(rows)
+            )
             conn.commit()
-            logger.info("Committed sucessfully !!!")
-        else:
-            conn.rollback()
-            logger.warn("Commit to database unsucessful !!!")
+        logger.info("Committed %d feedback rows sucessfully !!!", len(rows))
     except Exception as e:
-        logger.error(f"Error in inserting into the database {e}")
+        logger.error("Error in inserting into the database %s", e)
         conn.rollback()
-
-    cursor.close()
-    conn.close()
-    return
+        raise
+    finally:
+        # The connection goes back to the pool
+        cursor.close()
     
-def insert_to_db_feed(conn, json):
+def insert_to_db_feed(conn, rows):
+    """
+    Multi-row insert of (text, label) rows into the sd_feed table
+    Raises on failure so that the write-behind writer keeps the rows for retry
+    """
     cursor = conn.cursor()
     try: 
-        cursor.execute(
-            """ INSERT INTO sd_feed (text_message, label)
-            VALUES (%s, %s)
-            """,
-            (json.text, json.label)
-        )
-
-        logger.info("Insertion of the row is successful")
-        if cursor.rowcount > 0:
+        with stage_latency.labels(stage="db_insert").time():
+            execute_values(
+                cursor,
+                "INSERT INTO sd_feed (text_message, label) VALUES %s",
+                rows,
+                page_size = len(rows)
+            )
             conn.commit()
-            logger.info("Committed sucessfully !!!")
-        else:
-            conn.rollback()
-            logger.warn("Commit to database unsucessful !!!")
+        logger.info("Committed %d sd_feed rows sucessfully !!!", len(rows))
     except Exception as e:
-        logger.error(f"Error in inserting into the database {e}")
+        logger.error("Error in inserting into the database %s", e)
         conn.rollback()
+        raise
+    finally:
+        # The connection goes back to the pool
+        cursor.close()
+
+# Buffers the rows of /feedback and /diagnostic and writes them in batches
+db_writer = WriteBehindWriter(db_pool,
+                              {"feedback": insert_to_db_feedback, "sd_feed": insert_to_db_feed},
+                              max_queue=WRITE_BEHIND_MAX_QUEUE,
+                              flush_rows=WRITE_BEHIND_FLUSH_ROWS,
+                              flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                              policy=WRITE_BEHIND_POLICY,
+                              queue_gauge=db_write_queue_length,
+                              flush_latency_metric=db_flush_latency,
+                              rows_per_flush_metric=db_rows_per_flush,
+                              dropped_counter=db_rows_dropped)
+
+
+def risk_from_score(prediction):
+    """
+    Maps the model output probability to the risk bucket
+    """
+    if prediction >= 0.5:
+        return "high"
+    elif prediction >= 0.3:
+        return "medium"
+    return "low"
+
+# The drift verdict depends on the raw text (non-latin ratio) so it is keyed on the feature vector,
+# the model score only depends on the vocab-mapped sequence
+drift_cache = PredictionCache("drift", max_size=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL,
+                              events_counter=prediction_cache_events, size_gauge=prediction_cache_size)
+score_cache = PredictionCache("score", max_size=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL,
+                              events_counter=prediction_cache_events, size_gauge=prediction_cache_size)
+
+def sequence_key(sequence):
+    """
+    Cache key of a padded id sequence
+    """
+    return hashlib.blake2b(sequence.tobytes(), digest_size=16).digest()
 
-    cursor.close()
-    conn.close()
-    return
+def score_texts(texts):
+    """
+    Scores a list of texts with one drift check and one onnx call
+    Cached drift verdicts and scores skip the IsolationForest and onnx calls
+    Returns the risk labels (or drift_detected) in input order
+    """
+    risks = ["drift_detected"] * len(texts)
+    # Cleaning and tokenizing once for both the drift check and the model input
+    stage_times = {}
+    features, sequences = analyze_many(processor, detector, texts, stage_times)
+    for stage, seconds in stage_times.items():
+        stage_latency.labels(stage=stage).observe(seconds)
+
+    drifted = np.zeros(len(texts), dtype=bool)
+    drift_keys = [row.tobytes() for row in features]
+    missing = []
+    for i, key in enumerate(drift_keys):
+        cached = drift_cache.get(key)
+        if cached is None:
+            missing.append(i)
+        else:
+            drifted[i] = cached
+    if missing:
+        with stage_latency.labels(stage="isolation_forest").time():
+            drifted[missing] = detector.is_drifted_features(features[missing])
+        for i in missing:
+            drift_cache.put(drift_keys[i], bool(drifted[i]))
+
+    keep = np.flatnonzero(~drifted)
+    logger.info("drift detected for %d of %d inputs", len(texts) - len(keep), len(texts))
+
+    scores = {}
+    missing = []
+    for i in keep:
+        key = sequence_key(sequences[i])
+        cached = score_cache.get(key)
+        if cached is None:
+            missing.append((i, key))
+        else:
+            scores[i] = cached
+    if missing:
+        with stage_latency.labels(stage="inference").time():
+            ort_output = session.run(None, {"input" : sequences[[i for i, _ in missing]]})
+        predictions = np.asarray(ort_output[0]).reshape(-1)
+        for (i, key), prediction in zip(missing, predictions):
+            scores[i] = float(prediction)
+            score_cache.put(key, scores[i])
+
+    for i in keep:
+        risks[i] = risk_from_score(scores[i])
+    return risks
+
+# Coalesces concurrent /predict calls into one drift check and one onnx call
+# Inference runs on its own threads (not the threadpool shared with the database endpoints) behind
+# a bounded admission queue, and coalesces concurrent requests into one drift check and one onnx call
+batcher = MicroBatcher(score_texts,
+                       max_batch_size=PREDICT_MAX_BATCH_SIZE,
+                       max_wait=PREDICT_MAX_WAIT_MS / 1000,
+                       workers=INFERENCE_THREADS,
+                       max_queue=INFERENCE_MAX_QUEUE,
+                       queue_gauge=predict_queue_depth,
+                       batch_size_metric=predict_batch_size,
+                       wait_metric=inference_queue_wait)
+
+# Readiness of this process : set once the model session and the predict path are warmed up
+ready = Event()
+startup_error = None
+
+# A few texts of different lengths, with known and unknown words, going through the whole predict path
+WARMUP_TEXTS = ["I feel fine today, thanks for asking",
+                "Nothing seems to matter anymore and I cannot sleep at night " * 10,
+                "Hello world 123",
+                "This is a longer message about work, friends, family and the weekend plans " * 40]
+
+def warm_up_predict_path():
+    """
+    Runs the predict path once outside the caches and metrics (first lemmatization loads wordnet,
+    drift forest, onnx session with text inputs), then marks the process ready
+    """
+    global startup_error
+    try:
+        with startup.phase("predict_warmup"):
+            missing = missing_nltk_data(["corpora/wordnet"])
+            if missing:
+                raise LookupError(f"NLTK data {missing} not found in the NLTK_DATA paths (it is not downloaded at runtime)")
+            features, sequences = analyze_many(processor, detector, WARMUP_TEXTS)
+            detector.is_drifted_features(features)
+            session.run(None, {"input": sequences})
+    except Exception as e:
+        startup_error = str(e)
+        logger.error("Predict path warm-up failed, the backend stays not ready : %s", e)
+        return
+    ready.set()
+    logger.info("Backend ready %.3f s after start (%s)", time.perf_counter() - STARTUP_STARTED, startup.summary())
 
+def overloaded_response(endpoint, error):
+    """
+    Fast 429 when the inference queue is full
+    """
+    logger.warning("%s rejected : %s", endpoint, error)
+    inference_rejected.labels(endpoint=endpoint).inc()
+    return JSONResponse(content={"error": "Inference capacity exceeded, retry later"}, status_code=429,
+                        headers={"Retry-After": str(INFERENCE_RETRY_AFTER)})
 
-@app.post("/predict")
-@api_usage.time()
-def predict_using_model(input : input_data, request:Request):
-    # Logging #
-    logger.info(f"predict body : receiving {len(input.text)} bytes on input")
-    # tracking te amount of data processed by API #
-    request_size.observe(amount = len(input.text))
-    # Increasing the counter of API per host
-    api_counter.labels(endpoint = "/predict", client=request.client.host).inc()
-    # Preprocessing the text
-    logger.info("Processing the text input")
-    text_in = input.text
-
-    if detector.is_drifted(text_in):
-        logger.info("drift detected for the input ...")
-        return {"risk" : "drift_detected"}
-
-    text_pr = processor.process(text_in)
-    # Predicting using the model
-    logger.info("Predicting from the processed text input")
-    ort_input = {"input" : text_pr}
-    ort_output = session.run(None, ort_input)
-
-    prediction = ort_output[0].item()
-
-    # Output 
-    if prediction >= 0.5:
-        output = "high"
-    elif prediction >=0.3:
-        output = "medium"
-    else:
-        output = "low"
+@app.get("/ready")
+def readiness():
+    """
+    200 once the model is loaded and the predict path warmed up in this process, 503 before
+    (probes are not counted in the API usage metrics)
+    """
+    content = {"ready": ready.is_set(), "startup_phases_secs": dict(startup.phases)}
+    if startup_error is not None:
+        content["error"] = startup_error
+    return JSONResponse(content=content, status_code=200 if ready.is_set() else 503)
 
-    return {"risk" : output}
+@app.post("/predict")
+async def predict_using_model(input : input_data, request:Request):
+    with api_usage.time():
+        # Logging #
+        logger.info("predict body : receiving %d bytes on input", len(input.text))
+        # tracking te amount of data processed by API #
+        request_size.observe(amount = len(input.text))
+        # Increasing the counter of API per host
+        api_counter.labels(endpoint = "/predict", client=request.client.host).inc()
+        # Preprocessing and predicting, batched together with concurrent requests
+        logger.info("Queueing the text input for batched prediction")
+        try:
+            future = batcher.submit(input.text)
+        except Overloaded as e:
+            return overloaded_response("/predict", e)
+        risk = await asyncio.wrap_future(future)
+
+        # Output 
+        return {"risk" : risk}
+
+@app.post("/predict_batch")
+async def predict_batch_using_model(input : input_batch, request:Request):
+    with api_usage.time():
+        # Logging #
+        logger.info("predict_batch body : receiving %d texts on input", len(input.texts))
+        # tracking the amount of data processed by API #
+        request_size.observe(amount = sum(len(text) for text in input.texts))
+        # Increasing the counter of API per host
+        api_counter.labels(endpoint = "/predict_batch", client=request.client.host).inc()
+
+        if len(input.texts) > PREDICT_BATCH_MAX:
+            logger.warning("batch of %d texts exceeds the limit of %d", len(input.texts), PREDICT_BATCH_MAX)
+            return JSONResponse(content={"error": f"At most {PREDICT_BATCH_MAX} texts per batch"}, status_code=413)
+
+        # Drift check, preprocessing and prediction for the whole batch at once
+        logger.info("Predicting from the processed batch input")
+        try:
+            future = batcher.submit_many(input.texts)
+        except Overloaded as e:
+            return overloaded_response("/predict_batch", e)
+        return {"risk" : await asyncio.wrap_future(future)}
 
 @app.post("/feedback")
 @api_usage.time()
 def feedback_loader(data : input_feedback, request:Request):
     # Logging #
-    logger.info(f"feedback body : receiving {len(data.comments)} bytes on input")
+    logger.info("feedback body : receiving %d bytes on input", len(data.comments))
     # Tracking the amount of data processed by the API #
     request_size.observe(amount = len(data.comments))
     # Increasing the API usage count per host
     api_counter.labels(endpoint = "/feedback", client=request.client.host).inc()
 
     # Enter into the database
-    logger.info("pushing the data into the database")
-    conn = connect_to_db()
-    insert_to_db_feedback(conn, data)
+    logger.info("queueing the data for the database")
+    try:
+        db_writer.put("feedback", (data.rating, data.comments))
+    except QueueFull as e:
+        logger.error("Database writes backed up, feedback rejected : %s", e)
+        return JSONResponse(content={"error": "Database busy"}, status_code=503)
 
     return None
 
@@ -256,81 +664,223 @@ def feedback_loader(data : input_feedback, request:Request):
 @api_usage.time()
 def feed_loader(data : input_diagnostic, request:Request):
     # Logging #
-    logger.info(f"feedback body : receiving {len(data.text)} bytes on input")
-    logger.info(f"feedback body : receiving {len(data.label)} bytes on input")
+    logger.info("feedback body : receiving %d bytes on input", len(data.text))
+    logger.info("feedback body : receiving %d bytes on input", len(data.label))
     # Tracking the amount of data processed by the API #
     request_size.observe(amount = len(data.text))
     # Increasing the API usage count per host
     api_counter.labels(endpoint = "/diagnostic", client=request.client.host).inc()
 
     # Enter into the database
-    logger.info("pushing the data into the database")
-    conn = connect_to_db()
-    insert_to_db_feed(conn, data)
+    logger.info("queueing the data for the database")
+    try:
+        db_writer.put("sd_feed", (data.text, data.label))
+    except QueueFull as e:
+        logger.error("Database writes backed up, diagnostic rejected : %s", e)
+        return JSONResponse(content={"error": "Database busy"}, status_code=503)
 
     return None
 
+# Visualization images, served from memory and reloaded when the file changes on disk
+VISUALIZATIONS_DIR = "/var/Data_/"
+PLOT_FILES = {
+    "CDD": "CDD.png",
+    "WC": "WC.png",
+    "WF": "WF.png",
+    "PIPE": "PIPE.png"
+}
+image_cache = FileCache("images", events_counter=file_cache_events)
+
 @app.get("/visualizations/{plot_name}")
 @api_usage.time()
 def image_output(plot_name : str, request:Request):
+    """
+    Image as base64 in json (kept for compatibility, /visualizations/{plot_name}/png serves the raw PNG)
+    """
     logger.info("Getting the image for visualization")
     # Increasing the API usage count per host
     api_counter.labels(endpoint = "/visualizations", client=request.client.host).inc()
 
-    # Define the path where images are stored
-    path = "/var/Data_/"
-
-    # A dictionary to map plot names to their respective file names
-    plot_files = {
-        "CDD": "CDD.png",
-        "WC": "WC.png",
-        "WF": "WF.png",
-        "PIPE": "PIPE.png"
-    }
-    
     # Check if the plot_name exists in the dictionary
-    if plot_name not in plot_files:
+    if plot_name not in PLOT_FILES:
         return JSONResponse(content={"error": "Plot not found"}, status_code=404)
 
     # Build the file path
-    file_path = path + plot_files[plot_name]
+    file_path = VISUALIZATIONS_DIR + PLOT_FILES[plot_name]
     
     try:
-        with open(file_path, "rb") as img_file:
-            encoded_string = base64.b64encode(img_file.read()).decode("utf-8")
-        return JSONResponse(content={"image_base64": encoded_string})
+        return JSONResponse(content={"image_base64": image_cache.get(file_path).base64})
     except FileNotFoundError:
         return JSONResponse(content={"error": f"File {file_path} not found"}, status_code=404)
     except Exception as e:
-        logger.error(f"Error processing the image: {e}")
+        logger.error("Error processing the image: %s", e)
         return JSONResponse(content={"error": "An error occurred while processing the image"}, status_code=500)
 
+@app.get("/visualizations/{plot_name}/png")
+@api_usage.time()
+def image_png(plot_name : str, request:Request):
+    """
+    Raw PNG with ETag / Last-Modified validators, 304 when the client copy is still current
+    """
+    logger.info("Getting the raw image for visualization")
+    api_counter.labels(endpoint = "/visualizations/png", client=request.client.host).inc()
+
+    if plot_name not in PLOT_FILES:
+        return JSONResponse(content={"error": "Plot not found"}, status_code=404)
+    file_path = VISUALIZATIONS_DIR + PLOT_FILES[plot_name]
+
+    try:
+        entry = image_cache.get(file_path)
+    except FileNotFoundError:
+        return JSONResponse(content={"error": f"File {file_path} not found"}, status_code=404)
+    except Exception as e:
+        logger.error("Error processing the image: %s", e)
+        return JSONResponse(content={"error": "An error occurred while processing the image"}, status_code=500)
+
+    headers = {"ETag": entry.etag,
+               "Last-Modified": entry.last_modified,
+               "Cache-Control": f"public, max-age={VISUALIZATIONS_MAX_AGE}"}
+    if not_modified(entry, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.data, media_type="image/png", headers=headers)
+
 @app.get("/logs/{container_name}")
 @api_usage.time()
-def logs_output(container_name : str, request:Request):
+def logs_output(container_name : str, request:Request,
+                offset : Optional[int] = Query(None, ge=0), limit : Optional[int] = Query(None, ge=1),
+                tail : Optional[int] = Query(None, ge=1), before : Optional[int] = Query(None, ge=0)):
+    """
+    Reads only the requested part of a log file :
+    offset (and limit bytes) for the complete lines from a byte offset on, else the last `tail`
+    lines (before the byte offset `before` if given, LOGS_DEFAULT_TAIL_LINES lines by default)
+    next_offset in the response is where the next read / the follow stream continues
+    """
     logger.info("Getting the logs for visualization")
     # Increasing the API usage count per host
     api_counter.labels(endpoint = "/logs", client=request.client.host).inc()
 
-    # Defining the path where log are stored
-    path = f"/var/log/{container_name}.log"
+    # Only plain container names, stored as /var/log/<name>.log
+    path = log_path("/var/log", container_name)
+    if path is None:
+        return JSONResponse(status_code=400, content={"error": "Invalid container name"})
 
+    limit = min(limit or LOGS_MAX_BYTES, LOGS_MAX_BYTES)
     try:
-        with open(path, 'r') as file:
-            log_text = file.read()
-        
-        return {"log_text": log_text}
+        if offset is not None:
+            return read_log_range(path, offset, limit)
+        return read_log_tail(path, tail or LOGS_DEFAULT_TAIL_LINES, before=before, max_bytes=limit)
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"No log file for {container_name}"})
     except Exception as e:
-        logger.error(f"Error reading log file: {str(e)}")
+        logger.error("Error reading log file: %s", e)
         return JSONResponse(
             status_code=500,
             content={"error": "Failed to read log file"}
         )
 
-if __name__ == "__main__":
-    # Starting to expose the metrics at prometheus monitor
+@app.get("/logs/{container_name}/follow")
+async def logs_follow(container_name : str, request:Request, offset : Optional[int] = Query(None, ge=0)):
+    """
+    Server-sent events of the lines appended to a log file from the byte offset on (the end of the file
+    by default, or the Last-Event-ID of a reconnecting EventSource)
+    """
+    logger.info("Following the logs for visualization")
+    api_counter.labels(endpoint = "/logs/follow", client=request.client.host).inc()
+
+    path = log_path("/var/log", container_name)
+    if path is None:
+        return JSONResponse(status_code=400, content={"error": "Invalid container name"})
+    if not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": f"No log file for {container_name}"})
+
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+    elif offset is None:
+        offset = os.path.getsize(path)
+
+    return StreamingResponse(follow_log(path, offset, request.is_disconnected,
+                                        interval=LOGS_FOLLOW_INTERVAL, heartbeat=LOGS_FOLLOW_HEARTBEAT,
+                                        max_secs=LOGS_FOLLOW_MAX_SECS, limit=LOGS_MAX_BYTES),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+def run_worker(sock):
+    """
+    Worker process : own onnx session (its thread pool does not survive a fork), then serve on the shared socket
+    """
+    load_session()
+    config = uvicorn.Config(app, host="0.0.0.0", port=4000)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def spawn_worker(sock):
+    pid = os.fork()
+    if pid == 0:
+        # Default signal handling in the worker, uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_worker(sock)
+        finally:
+            os._exit(0)
+    return pid
+
+def serve_prefork(workers):
+    """
+    Pre-fork serving : the model artifacts loaded above are shared copy-on-write by the workers,
+    which accept on one listening socket. The master aggregates the metrics of all workers
+    and restarts the ones that die.
+    """
+    global session
+    # onnx runtime threads cannot cross a fork, the master's session is released first
+    session = None
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", 4000))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = {spawn_worker(sock) for _ in range(workers)}
+    logger.info("Started %d backend workers : %s", workers, sorted(children))
+
+    # Metrics of all the workers, plus the build information of the master
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(info)
     logger.info("Starting the prometheus monitor at port 18001")
-    start_http_server(18001)
+    start_http_server(18001, registry=registry)
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        multiprocess.mark_process_dead(pid)
+        if not stopping:
+            logger.error("Backend worker %d exited with status %d, restarting it", pid, status)
+            children.add(spawn_worker(sock))
+    logger.info("All backend workers stopped")
+
+if __name__ == "__main__":
+    if BACKEND_WORKERS > 1:
+        serve_prefork(BACKEND_WORKERS)
+    else:
+        # Starting to expose the metrics at prometheus monitor
+        logger.info("Starting the prometheus monitor at port 18001")
+        start_http_server(18001)
 
-    # Starting the fastAPI server
-    uvicorn.run("__main__:app", host = "0.0.0.0", port=4000)
\ No newline at end of file
+        # Starting the fastAPI server
+        uvicorn.run("__main__:app", host = "0.0.0.0", port=4000)
\ No newline at end of file
@@ -0,0 +1,227 @@
+## Offline bulk scoring of the postgres tables (without the HTTP API) ##
+
+# Usage (inside the backend container) : python batch_score.py [--tables sd_en_test,sd_sp_test,sd_feed] [--workers 4]
+# Rows are streamed with a server-side cursor, scored in large batches and written to the results table with COPY.
+# A run resumes after the last id already scored for the table and model, --restart scores the tables again.
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psycopg2
+from psycopg2 import sql
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+from Utils import TextPreprocessor, DriftDetector, analyze_many, available_cpus, build_session, risk_buckets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RESULTS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {} (
+    source_table TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    score REAL NOT NULL,
+    risk TEXT NOT NULL,
+    drifted BOOLEAN NOT NULL,
+    scored_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (source_table, source_id, model)
+)
+"""
+
+# Per process scoring state : the preprocessor and the detector are loaded before the workers are
+# forked (shared copy-on-write), each worker creates its own onnx session (threads do not survive a fork)
+processor = None
+detector = None
+session = None
+
+
+def load_pickle(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def connect_to_db():
+    """
+    Connection with the same database settings as the backend
+    """
+    return psycopg2.connect(dbname=os.getenv('POSTGRES_DB', 'postgres'),
+                            user=os.getenv('POSTGRES_USER', 'postgres'),
+                            password=os.getenv('POSTGRES_PASSWORD', 'postgres'),
+                            host=os.getenv('POSTGRES_HOST', 'postgres_db'),
+                            port=int(os.getenv('POSTGRES_PORT', 5432)))
+
+def init_scorer(model_path, intra_op_threads):
+    global session
+    session, _ = build_session(model_path, intra_op_threads=intra_op_threads)
+
+def score_batch(ids, texts):
+    """
+    Scores a batch with one drift check and one onnx call
+    Returns: (ids, scores, risks, drifted)
+    """
+    features, sequences = analyze_many(processor, detector, texts)
+    drifted = detector.is_drifted_features(features)
+    scores = np.asarray(session.run(None, {"input": sequences})[0], dtype=np.float32).reshape(-1)
+    return ids, scores, risk_buckets(scores), drifted
+
+def checkpoint(conn, results_table, table, model):
+    """
+    Last source id already scored for the table and model (0 when none)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("SELECT max(source_id) FROM {} WHERE source_table = %s AND model = %s")
+                       .format(sql.Identifier(results_table)), (table, model))
+        last_id = cursor.fetchone()[0]
+    return last_id or 0
+
+def stream_batches(conn, table, after_id, batch_size, fetch_size):
+    """
+    Yields (ids, texts) batches of the rows with an id above after_id, in id order
+    The named (server-side) cursor keeps only fetch_size rows on the client at a time
+    """
+    with conn.cursor(name=f"batch_score_{table}") as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(sql.SQL("SELECT id, text_message FROM {} WHERE id > %s ORDER BY id")
+                       .format(sql.Identifier(table)), (after_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [row[0] for row in rows], [row[1] for row in rows]
+
+def copy_results(conn, results_table, table, model, ids, scores, risks, drifted):
+    """
+    Writes one scored batch with COPY and commits it (the committed rows are the resume checkpoint)
+    """
+    buffer = io.StringIO()
+    for source_id, score, risk, drift in zip(ids, scores, risks, drifted):
+        buffer.write(f"{table}\t{source_id}\t{model}\t{score:.6g}\t{risk}\t{'t' if drift else 'f'}\n")
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(sql.SQL("COPY {} (source_table, source_id, model, score, risk, drifted) FROM STDIN")
+                           .format(sql.Identifier(results_table)), buffer)
+    conn.commit()
+
+def score_table(read_conn, write_conn, executor, table, args, model):
+    """
+    Scores the rows of one table not scored yet, returns its report
+    """
+    if args.restart:
+        with write_conn.cursor() as cursor:
+            cursor.execute(sql.SQL("DELETE FROM {} WHERE source_table = %s AND model = %s")
+                           .format(sql.Identifier(args.results_table)), (table, model))
+        write_conn.commit()
+
+    start_id = checkpoint(write_conn, args.results_table, table, model)
+    logging.info(f"Scoring {table} after id {start_id}")
+    report = {'resumed_after_id': start_id, 'rows': 0, 'drifted': 0,
+              'risks': {'high': 0, 'medium': 0, 'low': 0}, 'last_id': start_id}
+
+    def write(result):
+        ids, scores, risks, drifted = result
+        copy_results(write_conn, args.results_table, table, model, ids, scores, risks, drifted)
+        report['rows'] += len(ids)
+        report['drifted'] += int(np.sum(drifted))
+        for risk, count in zip(*np.unique(risks, return_counts=True)):
+            report['risks'][str(risk)] += int(count)
+        report['last_id'] = ids[-1]
+        logging.info(f"{table} : {report['rows']} rows scored (last id {ids[-1]})")
+
+    started = time.perf_counter()
+    batches = stream_batches(read_conn, table, start_id, args.batch_size, args.fetch_size)
+    if executor is None:
+        for ids, texts in batches:
+            write(score_batch(ids, texts))
+    else:
+        # Batches are written in submission order so that the last committed id stays a valid checkpoint,
+        # at most two batches per worker are in flight
+        pending = deque()
+        for ids, texts in batches:
+            pending.append(executor.submit(score_batch, ids, texts))
+            if len(pending) >= 2 * args.workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    read_conn.commit()
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_sec'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else 0.0
+    return report
+
+def main():
+    global processor, detector
+
+    parser = argparse.ArgumentParser(description="Bulk scoring of the postgres tables into a results table")
+    parser.add_argument("--tables", default="sd_en_test,sd_sp_test,sd_feed", help="comma separated tables to score")
+    parser.add_argument("--results-table", default="scoring_results")
+    parser.add_argument("--model", default=os.getenv('MODEL_PATH', '/var/Data_/model_best.onnx'))
+    parser.add_argument("--data-dir", default="/var/Data_")
+    parser.add_argument("--batch-size", type=int, default=2048, help="rows per onnx call")
+    parser.add_argument("--fetch-size", type=int, default=10000, help="rows per round trip of the server-side cursor")
+    parser.add_argument("--workers", type=int, default=1, help="scoring processes (1 = score in this process)")
+    parser.add_argument("--restart", action="store_true", help="drop the previous results of the tables and model")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    processor = load_pickle(os.path.join(args.data_dir, "preprocess_obj_numpy.pkl"))
+    detector = load_pickle(os.path.join(args.data_dir, "drift_uni_obj.pkl"))
+    model = os.path.basename(args.model)
+    tables = [table for table in args.tables.split(",") if table]
+
+    try:
+        read_conn, write_conn = connect_to_db(), connect_to_db()
+    except psycopg2.OperationalError as e:
+        logging.error(f"Error in connecting to the database {e}")
+        sys.exit(1)
+
+    with write_conn.cursor() as cursor:
+        cursor.execute(sql.SQL(RESULTS_TABLE_DDL).format(sql.Identifier(args.results_table)))
+    write_conn.commit()
+
+    # Workers share the CPUs, each session gets its part of them
+    intra_op_threads = max(1, available_cpus() // args.workers)
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("fork"),
+                                       initializer=init_scorer, initargs=(args.model, intra_op_threads))
+    else:
+        init_scorer(args.model, intra_op_threads)
+
+    report = {'model': model, 'workers': args.workers, 'batch_size': args.batch_size, 'tables': {}}
+    started = time.perf_counter()
+    try:
+        for table in tables:
+            report['tables'][table] = score_table(read_conn, write_conn, executor, table, args, model)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        read_conn.close()
+        write_conn.close()
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows'] = sum(table_report['rows'] for table_report in report['tables'].values())
+    report['rows_per_sec'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else 0.0
+
+    print(f"{'table':>12} {'resumed':>9} {'rows':>9} {'rows/s':>9} {'drifted':>8} {'high':>7} {'medium':>7} {'low':>7} {'checkpoint':>11}")
+    for table, r in report['tables'].items():
+        print(f"{table:>12} {r['resumed_after_id']:>9} {r['rows']:>9} {r['rows_per_sec']:>9.0f} {r['drifted']:>8} "
+              f"{r['risks']['high']:>7} {r['risks']['medium']:>7} {r['risks']['low']:>7} {r['last_id']:>11}")
+    print(f"{report['rows']} rows in {report['seconds']:.1f} s ({report['rows_per_sec']:.0f} rows/s, "
+          f"{args.workers} worker(s), model {model})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+## Benchmark suite of the /predict hot path : per stage and end to end timings with baseline comparison ##
+
+# Usage (from the BACKEND_ folder) :
+#   python benchmarks/bench_hot_path.py --output bench.json                         (store a baseline)
+#   python benchmarks/bench_hot_path.py --output new.json --baseline bench.json     (flag regressions)
+# The exit code is 1 when a timing is slower than the baseline by more than --threshold
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.join(BENCH_DIR, "..")]
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+from Utils import TextPreprocessor, DriftDetector, analyze_many, build_session
+from bench_shared_analysis import load_pickle, synthetic_text
+
+REPO_ROOT = os.path.join(BENCH_DIR, "..", "..")
+
+
+def request_words(path):
+    """
+    Words of the titles and bodies of requests.jsonl (real English prose), None if the file is missing
+    """
+    if not os.path.exists(path):
+        return None
+    words = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                request = json.loads(line)
+                words.extend(f"{request.get('title', '')} {request.get('body', '')}".split())
+    return words or None
+
+def corpus_texts(words, n_words, count, rng):
+    """
+    count texts of n_words consecutive words, starting at random offsets of the cycled word list
+    """
+    texts = []
+    for _ in range(count):
+        start = rng.randrange(len(words))
+        texts.append(' '.join(words[(start + i) % len(words)] for i in range(n_words)))
+    return texts
+
+def measure(fn, rounds):
+    """
+    Median seconds per call of fn over `rounds` rounds (each round long enough to be timed reliably)
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(repeat=rounds, number=number)) / number
+
+def bench_stages(processor, detector, session, texts, rounds):
+    """
+    Seconds per text of each stage of the predict path, one text at a time
+    """
+    cleaned = [processor.clean_text(text) for text in texts]
+    features = detector.extract_features_many(texts)
+    sequences = processor.process_batch(texts)
+
+    def each(fn, items):
+        return lambda: [fn(item) for item in items]
+
+    per_text = len(texts)
+    return {
+        'clean_text': measure(each(processor.clean_text, texts), rounds) / per_text,
+        'text_to_sequence+pad_sequence': measure(
+            each(lambda text: processor.pad_sequence(processor.text_to_sequence(text)), cleaned), rounds) / per_text,
+        'encode': measure(each(processor.encode, texts), rounds) / per_text,
+        'extract_features': measure(each(detector.extract_features, texts), rounds) / per_text,
+        'isolation_forest.predict': measure(each(lambda row: detector.model.predict(row[np.newaxis]), features),
+                                            rounds) / per_text,
+        'session.run': measure(each(lambda row: session.run(None, {"input": row[np.newaxis]}), sequences),
+                               rounds) / per_text,
+    }
+
+def bench_full_path(processor, detector, session, texts, batch_size, rounds):
+    """
+    Seconds per text of the uncached score_texts path : shared analysis, one drift check, one onnx call
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def run():
+        for batch in batches:
+            features, sequences = analyze_many(processor, detector, batch)
+            detector.is_drifted_features(features)
+            session.run(None, {"input": sequences})
+
+    return measure(run, rounds) / len(texts)
+
+def compare(results, baseline, threshold):
+    """
+    Ratios new / baseline of the common timings, the ones above 1 + threshold are regressions
+    """
+    comparison = {}
+    for key, seconds in results.items():
+        if key in baseline and baseline[key] > 0:
+            ratio = seconds / baseline[key]
+            comparison[key] = {'baseline': baseline[key], 'current': seconds, 'ratio': ratio,
+                               'regression': ratio > 1 + threshold}
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Per stage and end to end timings of the /predict hot path")
+    parser.add_argument("--data-dir", default="/var/Data_")
+    parser.add_argument("--model", default="/var/Data_/model_best.onnx")
+    parser.add_argument("--requests", default=os.path.join(REPO_ROOT, "requests.jsonl"),
+                        help="jsonl file whose titles / bodies form the real text corpus")
+    parser.add_argument("--lengths", default="10,100,1000,5000", help="comma separated words per text")
+    parser.add_argument("--batch-sizes", default="1,8,32,128", help="comma separated batch sizes of the full path")
+    parser.add_argument("--texts", type=int, default=128, help="texts per corpus and length")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=1, help="intra op threads of the onnx session")
+    parser.add_argument("--output", default="bench_hot_path.json")
+    parser.add_argument("--baseline", default=None, help="results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    processor = load_pickle(os.path.join(args.data_dir, "preprocess_obj_numpy.pkl"))
+    detector = load_pickle(os.path.join(args.data_dir, "drift_uni_obj.pkl"))
+    session, session_settings = build_session(args.model, intra_op_threads=args.threads)
+
+    rng = random.Random(42)
+    vocab_words = list(processor.vocab)[:5000]
+    corpora = {'synthetic': lambda n_words: [synthetic_text(vocab_words, n_words, rng) for _ in range(args.texts)]}
+    words = request_words(args.requests)
+    if words is None:
+        print(f"{args.requests} not found, benchmarking the synthetic corpus only")
+    else:
+        corpora['requests'] = lambda n_words: corpus_texts(words, n_words, args.texts, rng)
+
+    results = {}
+    for corpus, make_texts in corpora.items():
+        for n_words in [int(n) for n in args.lengths.split(",")]:
+            texts = make_texts(n_words)
+            # Warm-up (lemmatizer memo, latin lookup table, onnx allocations)
+            bench_full_path(processor, detector, session, texts[:8], 8, 1)
+
+            for stage, seconds in bench_stages(processor, detector, session, texts, args.rounds).items():
+                results[f"{corpus}/{stage}/words={n_words}"] = seconds
+            for batch_size in [int(n) for n in args.batch_sizes.split(",")]:
+                results[f"{corpus}/full_path/words={n_words}/batch={batch_size}"] = bench_full_path(
+                    processor, detector, session, texts, batch_size, args.rounds)
+            print(f"{corpus} {n_words} words done")
+
+    report = {'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'machine': {'python': platform.python_version(), 'processor': platform.processor(),
+                          'cpus': os.cpu_count()},
+              'settings': {**vars(args), 'session': session_settings},
+              'unit': 'seconds per text',
+              'results': results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        report['comparison'] = compare(results, baseline, args.threshold)
+        regressions = [key for key, entry in report['comparison'].items() if entry['regression']]
+
+    print(f"{'timing':<70} {'us/text':>10} {'vs base':>8}")
+    for key, seconds in results.items():
+        entry = report.get('comparison', {}).get(key)
+        change = f"{entry['ratio'] - 1:>+8.1%}" if entry else f"{'':>8}"
+        flag = "  REGRESSION" if entry and entry['regression'] else ""
+        print(f"{key:<70} {seconds * 1e6:>10.2f} {change}{flag}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} timings slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
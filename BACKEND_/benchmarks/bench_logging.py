@@ -0,0 +1,212 @@
+## Benchmark of the logging of a request : synchronous file / stream handlers vs the queued pipeline ##
+
+# Usage (from the BACKEND_ folder) :
+#   python benchmarks/bench_logging.py --requests 20000
+#   python benchmarks/bench_logging.py --write-latency-ms 0.2 --threads 8     (slow log volume, concurrent requests)
+#   python benchmarks/bench_logging.py --queue-size 10000                     (bounded as in the apps)
+#   python benchmarks/bench_logging.py --lean-records                         (LOG_LEAN_RECORDS=1 of the apps)
+# Each request logs the lines the /predict path logs. The time spent in the log calls is measured on the
+# request threads (what the request pays), then the time until the writer has written everything
+
+import argparse
+import contextvars
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "COMMON_"))
+
+from log_pipeline import TEXT_FORMAT, setup_logging, log_sampled
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+logger = logging.getLogger("bench")
+
+
+class SlowStream:
+    """
+    File wrapper whose flush takes write_latency seconds longer (a slow or remote log volume)
+    """
+    def __init__(self, stream, write_latency):
+        self.stream = stream
+        self.write_latency = write_latency
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+        if self.write_latency:
+            time.sleep(self.write_latency)
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def close(self):
+        self.stream.close()
+
+
+class RequestIdFilter(logging.Filter):
+    # The filter of the synchronous setup the apps used before the pipeline
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    return root
+
+def setup_sync(directory, level, write_latency):
+    """
+    Previous setup : FileHandler + StreamHandler, formatted and flushed by each log call
+    """
+    root = reset_root()
+    file_handler = logging.FileHandler(os.path.join(directory, "sync.log"), delay=True)
+    file_handler.setStream(SlowStream(open(os.path.join(directory, "sync.log"), "a"), write_latency))
+    stream_handler = logging.StreamHandler(SlowStream(open(os.path.join(directory, "sync.out"), "a"), write_latency))
+    for handler in (file_handler, stream_handler):
+        handler.addFilter(RequestIdFilter())
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def setup_queued(directory, level, write_latency, fmt, queue_size, lean_records):
+    """
+    Queued pipeline of log_pipeline.py, its outputs slowed down like the synchronous ones
+    """
+    reset_root()
+    stream = SlowStream(open(os.path.join(directory, f"queued_{fmt}.out"), "a"), write_latency)
+    writer = setup_logging(os.path.join(directory, f"queued_{fmt}.log"), request_id_var, level=level, fmt=fmt,
+                           rotate_bytes=64 * 1024 * 1024, queue_size=queue_size, stream=stream,
+                           lean_records=lean_records)
+    log_file = writer.outputs[0]
+    log_file._stream = SlowStream(log_file._stream, write_latency)
+    return writer
+
+def request_fstrings(i, text):
+    # The /predict lines as the apps wrote them before (messages built before the level is checked)
+    request_id_var.set(f"req-{i}")
+    logger.info(f"predict body : receiving {len(text)} bytes on input")
+    logger.info("Queueing the text input for batched prediction")
+    logger.info(f"drift detected for {0} of {1} inputs")
+    logger.info("Calling backend '/predict' from frontend using docker network")
+    logger.info(f"POST /predict -> 200 in {1.2345:.1f} ms")
+
+def request_lazy(i, text):
+    # The same lines with lazy arguments, only merged when a record is created
+    request_id_var.set(f"req-{i}")
+    logger.info("predict body : receiving %d bytes on input", len(text))
+    logger.info("Queueing the text input for batched prediction")
+    logger.info("drift detected for %d of %d inputs", 0, 1)
+    logger.info("Calling backend '/predict' from frontend using docker network")
+    logger.info("%s %s -> %d in %.1f ms", "POST", "/predict", 200, 1.2345)
+
+def run_requests(request_fn, n_requests, threads, sampled=True):
+    """
+    Seconds spent in the log calls of each request, requests spread over threads
+    """
+    timings = [[] for _ in range(threads)]
+    text = "some text of a request " * 10
+
+    def worker(index):
+        log_sampled.set(sampled)
+        own = timings[index]
+        for i in range(index, n_requests, threads):
+            start = time.perf_counter()
+            request_fn(i, text)
+            own.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sorted(t for own in timings for t in own)
+
+def bench_case(name, setup, request_fn, args, sampled=True):
+    with tempfile.TemporaryDirectory() as directory:
+        writer = setup(directory)
+        # Warm-up (files opened, code paths run once)
+        run_requests(request_fn, 100, 1, sampled)
+        if writer is not None:
+            writer.drain()
+
+        started = time.perf_counter()
+        timings = run_requests(request_fn, args.requests, args.threads, sampled)
+        returned = time.perf_counter() - started
+        if writer is not None:
+            writer.drain()
+        written = time.perf_counter() - started
+        dropped = writer.handler.dropped if writer is not None else 0
+        if writer is not None:
+            writer.stop()
+        reset_root()
+
+    result = {'caller_us_per_request_mean': statistics.fmean(timings) * 1e6,
+              'caller_us_per_request_p50': timings[len(timings) // 2] * 1e6,
+              'caller_us_per_request_p99': timings[int(len(timings) * 0.99)] * 1e6,
+              'requests_returned_secs': returned,
+              'all_written_secs': written,
+              'dropped_records': dropped}
+    print(f"{name:<34} {result['caller_us_per_request_mean']:>9.2f} {result['caller_us_per_request_p50']:>9.2f} "
+          f"{result['caller_us_per_request_p99']:>9.2f} {returned:>9.3f} {written:>9.3f} {dropped:>8}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time spent in the log calls of a request, per logging setup")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=1, help="threads issuing the requests")
+    parser.add_argument("--write-latency-ms", type=float, default=0.0,
+                        help="extra time per flush of a log output (slow log volume)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="queue of the pipeline (default : room for the whole run, LOG_QUEUE_SIZE of the apps "
+                             "shows the records shed when the writer falls behind)")
+    parser.add_argument("--lean-records", action="store_true",
+                        help="pipeline cases without the per record caller / thread / process lookups "
+                             "(LOG_LEAN_RECORDS=1 of the apps)")
+    parser.add_argument("--output", default="bench_logging.json")
+    args = parser.parse_args()
+    latency = args.write_latency_ms / 1000
+    queue_size = args.queue_size or (args.requests + 100) * 5
+
+    def sync(level):
+        return lambda directory: setup_sync(directory, level, latency)
+
+    def queued(level, fmt):
+        return lambda directory: setup_queued(directory, level, latency, fmt, queue_size, args.lean_records)
+
+    cases = {
+        'sync_text/fstrings': (sync("DEBUG"), request_fstrings, True),
+        'queued_text/lazy': (queued("DEBUG", "text"), request_lazy, True),
+        'queued_json/lazy': (queued("DEBUG", "json"), request_lazy, True),
+        'queued_json/lazy/sampled_out': (queued("DEBUG", "json"), request_lazy, False),
+        'sync_text/fstrings/level_off': (sync("WARNING"), request_fstrings, True),
+        'queued_json/lazy/level_off': (queued("WARNING", "json"), request_lazy, True),
+    }
+
+    print(f"{'setup':<34} {'us mean':>9} {'us p50':>9} {'us p99':>9} {'return s':>9} {'written s':>9} {'dropped':>8}")
+    results = {name: bench_case(name, setup, request_fn, args, sampled)
+               for name, (setup, request_fn, sampled) in cases.items()}
+
+    report = {'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'machine': {'python': platform.python_version(), 'processor': platform.processor(),
+                          'cpus': os.cpu_count()},
+              'settings': vars(args),
+              'unit': 'microseconds of log calls per request (5 lines), seconds for the whole run',
+              'results': results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
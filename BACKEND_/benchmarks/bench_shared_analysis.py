@@ -0,0 +1,81 @@
+## Microbenchmark : separate vs shared cleaning for the drift check and the model input ##
+
+# Usage (from the BACKEND_ folder) : python benchmarks/bench_shared_analysis.py --data-dir /var/Data_
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+from Utils import TextPreprocessor, DriftDetector, FlatIsolationForest, analyze_many
+
+
+def load_pickle(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def synthetic_text(words, n_words, rng):
+    """
+    Random text of n_words drawn from the vocabulary plus some noise tokens
+    """
+    noise = ['Hello!!', 'WORLD,', 'nahi', 'hai', '123', 'ok?']
+    return ' '.join(rng.choice(words) if rng.random() < 0.9 else rng.choice(noise) for _ in range(n_words))
+
+def cpu_time_per_call(fn, texts, repeat):
+    """
+    Mean CPU seconds per text over `repeat` passes of the corpus
+    """
+    start = time.process_time()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.process_time() - start) / (repeat * len(texts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU cost of separate vs shared text analysis")
+    parser.add_argument("--data-dir", default="/var/Data_")
+    parser.add_argument("--lengths", default="10,50,200,1000", help="comma separated words per text")
+    parser.add_argument("--texts", type=int, default=200, help="texts per length")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = load_pickle(os.path.join(args.data_dir, "preprocess_obj_numpy.pkl"))
+    detector = load_pickle(os.path.join(args.data_dir, "drift_uni_obj.pkl"))
+    # The forest as the backend runs it, the per call overhead of the sklearn one would hide the cleaning
+    detector.model = FlatIsolationForest.from_sklearn(detector.model)
+
+    rng = random.Random(42)
+    words = list(processor.vocab)[:5000]
+
+    def separate(text):
+        # Previous /predict path : is_drifted and process each clean the text (process is run for
+        # every text here, the few drifted ones skipped it)
+        detector.is_drifted(text)
+        processor.process(text)
+
+    def shared(text):
+        # Current path : one cleaning pass for the drift features and the model input, then the forest
+        features, _ = analyze_many(processor, detector, [text])
+        detector.is_drifted_features(features)
+
+    print(f"{'words':>6} {'separate (us)':>14} {'shared (us)':>12} {'saving':>8}")
+    for n_words in [int(n) for n in args.lengths.split(",")]:
+        texts = [synthetic_text(words, n_words, rng) for _ in range(args.texts)]
+        # Warm-up (lemmatizer memo, latin lookup table)
+        for text in texts:
+            separate(text)
+            shared(text)
+
+        t_separate = cpu_time_per_call(separate, texts, args.repeat)
+        t_shared = cpu_time_per_call(shared, texts, args.repeat)
+        saving = 1 - t_shared / t_separate
+        print(f"{n_words:>6} {t_separate * 1e6:>14.1f} {t_shared * 1e6:>12.1f} {saving:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+## In-process load test / replay harness of the backend and frontend apps ##
+
+# Usage (from the BACKEND_ folder, with the Data_ volume at /var/Data_) :
+#   python benchmarks/load_harness.py --target backend --concurrency 32 --requests 5000
+#   python benchmarks/load_harness.py --target frontend --rate 200 --stub-model --records recorded.jsonl
+#   python benchmarks/load_harness.py --url http://localhost:8000 --target frontend      (a running server)
+#
+# In process, the apps are driven through an httpx ASGI transport (the frontend proxies to the backend app
+# through one too) with their lifespans running. The database is replaced by a stand-in unless --db postgres
+# (POSTGRES_* pointing to a local server), --stub-model replaces the onnx session by random scores.
+#
+# Records are json lines : {"method": "POST", "path": "/feedback", "json": {...}} (backend paths) or lines in
+# the requests.jsonl format ({"title": ..., "body": ...}), which are sent to /predict with title + body as text.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+FRONTEND_DIR = os.path.join(BENCH_DIR, "..", "..", "FRONTEND_")
+sys.path[:0] = [BACKEND_DIR, FRONTEND_DIR]
+
+import httpx
+from prometheus_client import REGISTRY
+from prometheus_client.metrics import MetricWrapperBase
+from psycopg2 import extensions
+
+# The backend pickles reference the classes from the __main__ module
+import Utils
+from Utils import TextPreprocessor, DriftDetector
+
+# Backend routes proxied by the frontend under /backend
+PROXIED_ROUTES = ("/predict", "/feedback", "/diagnostic", "/visualizations", "/logs")
+
+
+class StubSession:
+    """
+    Stand-in for the onnx runtime session : random scores after a fixed delay per call
+    """
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+
+    def run(self, output_names, feeds):
+        if self.latency:
+            time.sleep(self.latency)
+        batch = next(iter(feeds.values()))
+        return [self.rng.random((len(batch), 1), dtype=np.float32)]
+
+
+class StubConnection:
+    """
+    Stand-in for a psycopg2 connection, enough for the connection pool (the writes go to StubDatabase)
+    """
+    closed = False
+
+    class info:
+        transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class StubDatabase:
+    """
+    Stand-in for the write-behind inserts : counts the rows per table after a fixed delay per flush
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.rows = {}
+
+    def insert_fn(self, table):
+        def insert(conn, rows):
+            if self.latency:
+                time.sleep(self.latency)
+            self.rows[table] = self.rows.get(table, 0) + len(rows)
+        return insert
+
+
+def unregister_metrics(module):
+    """
+    Both apps define some metrics under the same names, the ones of the first app are removed
+    from the default registry so that the second one can be imported in the same process
+    """
+    for value in vars(module).values():
+        if isinstance(value, MetricWrapperBase):
+            try:
+                REGISTRY.unregister(value)
+            except KeyError:
+                pass
+
+def load_apps(args):
+    """
+    Imports the apps with the stand-ins in place, returns (backend_app module, frontend_app module or None)
+    """
+    if args.stub_model:
+        # backend_app creates its session at import through Utils.build_session
+        Utils.build_session = lambda *a, **kw: (StubSession(args.model_latency_ms / 1000), {'model': 'stub'})
+
+    import backend_app
+    if args.db == "stub":
+        database = StubDatabase(args.db_latency_ms / 1000)
+        backend_app.db_pool.connect_fn = StubConnection
+        backend_app.db_writer.insert_fns = {table: database.insert_fn(table)
+                                            for table in backend_app.db_writer.insert_fns}
+        backend_app.stub_database = database
+
+    frontend_app = None
+    if args.target == "frontend":
+        unregister_metrics(backend_app)
+        # The frontend serves its pages and static files from its working directory
+        os.chdir(FRONTEND_DIR)
+        import frontend_app
+        frontend_app.backend_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend_app.app),
+                                                        base_url="http://backend", timeout=httpx.Timeout(30))
+
+    # The apps log every request at DEBUG, which would dominate the timings
+    logging.getLogger().setLevel(args.log_level)
+    return backend_app, frontend_app
+
+def load_records(path, target):
+    """
+    (method, path, json) calls from a json lines file
+    """
+    records = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "path" in record:
+                method, route, body = record.get("method", "POST").upper(), record["path"], record.get("json")
+            else:
+                method, route = "POST", "/predict"
+                body = {"text": f"{record.get('title', '')} {record.get('body', '')}".strip()}
+            if target == "frontend" and any(route == r or route.startswith(r + "/") for r in PROXIED_ROUTES):
+                route = "/backend" + route
+            records.append((method, route, body))
+    if not records:
+        raise ValueError(f"No records in {path}")
+    return records
+
+def endpoint_of(path):
+    """
+    Route the call is reported under (path parameters removed)
+    """
+    parts = path.split("?")[0].strip("/").split("/")
+    return "/" + "/".join(parts[:2] if parts[0] == "backend" else parts[:1])
+
+async def run_load(client, records, args):
+    """
+    Sends args.requests calls cycling over the records, returns [(endpoint, status or None, seconds)]
+    With a rate the arrivals are scheduled (poisson or uniform) and the latency counts from the scheduled
+    time, so time spent waiting for a free concurrency slot is included
+    """
+    results = []
+    slots = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    async def call(method, path, body, scheduled):
+        async with slots:
+            start = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            results.append((endpoint_of(path), status, time.perf_counter() - start))
+
+    tasks = []
+    next_arrival = time.perf_counter()
+    for i in range(args.requests):
+        method, path, body = records[i % len(records)]
+        if args.rate:
+            next_arrival += rng.expovariate(args.rate) if args.arrival == "poisson" else 1 / args.rate
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(call(method, path, body, next_arrival)))
+        else:
+            # Closed loop : a new call as soon as one of the concurrency slots frees up
+            await slots.acquire()
+            slots.release()
+            tasks.append(asyncio.create_task(call(method, path, body, None)))
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return results
+
+def summarize(results, seconds):
+    """
+    Throughput, latency percentiles and error rates per endpoint
+    """
+    report = {}
+    endpoints = sorted({endpoint for endpoint, _, _ in results})
+    for endpoint in endpoints + ["all"]:
+        rows = [row for row in results if endpoint == "all" or row[0] == endpoint]
+        latencies = np.array([latency for _, _, latency in rows])
+        statuses = {}
+        for _, status, _ in rows:
+            key = str(status) if status is not None else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        errors = sum(count for key, count in statuses.items() if key == "error" or int(key) >= 500)
+        report[endpoint] = {'requests': len(rows),
+                            'throughput_rps': len(rows) / seconds,
+                            'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+                            'p95_ms': float(np.percentile(latencies, 95) * 1e3),
+                            'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+                            'error_rate': errors / len(rows),
+                            'non_2xx_rate': sum(count for key, count in statuses.items()
+                                                if key == "error" or not key.startswith("2")) / len(rows),
+                            'statuses': statuses}
+    return report
+
+async def main_async(args):
+    records = load_records(args.records, args.target)
+
+    if args.url:
+        apps = []
+        client = httpx.AsyncClient(base_url=args.url, timeout=httpx.Timeout(30),
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        backend_app, frontend_app = load_apps(args)
+        apps = [backend_app.app] + ([frontend_app.app] if frontend_app else [])
+        target = frontend_app.app if frontend_app else backend_app.app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://harness",
+                                   timeout=httpx.Timeout(30))
+
+    # The ASGI transport does not run the lifespans (database pool, write-behind writer, upstream client)
+    lifespans = [app.router.lifespan_context(app) for app in apps]
+    for lifespan in lifespans:
+        await lifespan.__aenter__()
+    try:
+        started = time.perf_counter()
+        results = await run_load(client, records, args)
+        seconds = time.perf_counter() - started
+    finally:
+        await client.aclose()
+        for lifespan in reversed(lifespans):
+            await lifespan.__aexit__(None, None, None)
+
+    report = {'settings': vars(args), 'seconds': seconds, 'endpoints': summarize(results, seconds)}
+    if not args.url and args.db == "stub":
+        report['stub_database_rows'] = backend_app.stub_database.rows
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays recorded requests against the backend / frontend apps")
+    parser.add_argument("--target", choices=("backend", "frontend"), default="backend")
+    parser.add_argument("--url", default=None, help="drive a running server over HTTP instead of in process")
+    parser.add_argument("--records", default=os.path.join(BACKEND_DIR, "..", "requests.jsonl"))
+    parser.add_argument("--requests", type=int, default=1000, help="calls to send (the records are cycled)")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight at most")
+    parser.add_argument("--rate", type=float, default=0, help="arrivals per second (0 = closed loop)")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", choices=("stub", "postgres"), default="stub")
+    parser.add_argument("--db-latency-ms", type=float, default=2, help="delay of each stand-in database flush")
+    parser.add_argument("--stub-model", action="store_true", help="random scores instead of the onnx model")
+    parser.add_argument("--model-latency-ms", type=float, default=1, help="delay of each stub model call")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+
+    print(f"{'endpoint':<26} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'non 2xx':>8}")
+    for endpoint, r in report['endpoints'].items():
+        print(f"{endpoint:<26} {r['requests']:>9} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} "
+              f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['error_rate']:>7.1%} {r['non_2xx_rate']:>8.1%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+## Compares the fp32 and int8 model variants on the sd_en_test split : accuracy / F1, latency and memory ##
+
+# Usage (inside the backend container, after quantize_model.py) : python compare_variants.py [--limit 2000] [--json report.json]
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psycopg2
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+from Utils import TextPreprocessor, DriftDetector, build_session, risk_buckets, RISK_THRESHOLDS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+POSITIVE_LABEL = 'suicide'
+
+
+def load_pickle(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def fetch_test_split(limit=None):
+    """
+    Texts and labels of sd_en_test (same database settings as the backend)
+    """
+    conn = psycopg2.connect(dbname=os.getenv('POSTGRES_DB', 'postgres'),
+                            user=os.getenv('POSTGRES_USER', 'postgres'),
+                            password=os.getenv('POSTGRES_PASSWORD', 'postgres'),
+                            host=os.getenv('POSTGRES_HOST', 'postgres_db'),
+                            port=int(os.getenv('POSTGRES_PORT', 5432)))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT text_message, label FROM sd_en_test ORDER BY id LIMIT %s", (limit,))
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return [text for text, _ in rows], np.array([label == POSITIVE_LABEL for _, label in rows])
+
+def resident_memory_mb():
+    """
+    Current resident set size of this process (None where /proc is not available)
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def evaluate_variant(model_path, sequences, batch_size, latency_samples, intra_op_threads):
+    """
+    Runs in a fresh child process so the memory of one variant does not leak into the other
+    """
+    rss_before = resident_memory_mb()
+    session, _ = build_session(model_path, intra_op_threads=intra_op_threads)
+
+    scores = np.concatenate([session.run(None, {"input": sequences[i:i + batch_size]})[0].reshape(-1)
+                             for i in range(0, len(sequences), batch_size)])
+    rss_after = resident_memory_mb()
+
+    # Latency of single-text calls, as /predict does without coalescing
+    latencies = []
+    for row in sequences[:latency_samples]:
+        start = time.perf_counter()
+        session.run(None, {"input": row[np.newaxis]})
+        latencies.append(time.perf_counter() - start)
+
+    return {'model_path': model_path,
+            'model_size_mb': os.path.getsize(model_path) / 1e6,
+            'rss_mb': None if rss_before is None else rss_after - rss_before,
+            'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+            'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+            'scores': scores}
+
+def classification_metrics(scores, labels):
+    metrics = {}
+    for name, cutoff in RISK_THRESHOLDS.items():
+        predicted = scores >= cutoff
+        tp = int(np.sum(predicted & labels))
+        fp = int(np.sum(predicted & ~labels))
+        fn = int(np.sum(~predicted & labels))
+        metrics[f"{name}_accuracy"] = float(np.mean(predicted == labels))
+        metrics[f"{name}_f1"] = 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy / latency / memory of the fp32 and int8 model variants")
+    parser.add_argument("--fp32", default="/var/Data_/model_best.onnx")
+    parser.add_argument("--int8", default="/var/Data_/model_best_int8.onnx")
+    parser.add_argument("--data-dir", default="/var/Data_")
+    parser.add_argument("--limit", type=int, default=None, help="rows of sd_en_test to score (default all)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--latency-samples", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=0, help="intra op threads (0 = available CPUs)")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    processor = load_pickle(os.path.join(args.data_dir, "preprocess_obj_numpy.pkl"))
+    texts, labels = fetch_test_split(args.limit)
+    logging.info(f"Scoring {len(texts)} rows of sd_en_test ({labels.mean():.1%} {POSITIVE_LABEL})")
+    sequences = processor.process_batch(texts)
+
+    report = {}
+    for variant, model_path in (('fp32', args.fp32), ('int8', args.int8)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as executor:
+            result = executor.submit(evaluate_variant, model_path, sequences, args.batch_size,
+                                     args.latency_samples, args.threads).result()
+        result.update(classification_metrics(result['scores'], labels))
+        report[variant] = result
+
+    fp32_buckets, int8_buckets = risk_buckets(report['fp32'].pop('scores')), risk_buckets(report['int8'].pop('scores'))
+    report['bucket_agreement'] = float(np.mean(fp32_buckets == int8_buckets))
+    report['delta'] = {key: report['int8'][key] - report['fp32'][key]
+                       for key, value in report['fp32'].items()
+                       if isinstance(value, float) and report['int8'][key] is not None}
+
+    print(f"{'':>16} {'fp32':>10} {'int8':>10} {'delta':>10}")
+    for key, delta in report['delta'].items():
+        print(f"{key:>16} {report['fp32'][key]:>10.4f} {report['int8'][key]:>10.4f} {delta:>+10.4f}")
+    print(f"{'bucket agreement':>16} {report['bucket_agreement']:>32.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+## Converts the pickled preprocessor / drift detector to the compact pickle-free format and checks parity ##
+
+# Usage (inside the backend container) : python convert_artifacts.py [--output /var/Data_/compact]
+# The backend loads the compact artifacts when COMPACT_ARTIFACTS_DIR holds them (see load_compact in Utils.py)
+# The same parity is asserted by tests/test_compact_parity.py, this check guards each conversion (exit code 1)
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import random
+import sys
+import time
+
+import numpy as np
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+from Utils import TextPreprocessor, DriftDetector, analyze_many, save_compact, load_compact
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_pickle(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def parity_texts(processor, count, rng, texts_file=None):
+    """
+    Texts exercising the vocabulary (frequent, rare and long words), unknown words, non latin scripts
+    and empty inputs, plus the titles / bodies of a json lines file if given
+    """
+    words = list(processor.vocab)
+    noise = ['nahi', 'hai', 'zindagi', 'Hello,', 'WORLD!!', 'abc123', 'ñandú', '日本語', 'İstanbul', 'qwzxv']
+    texts = ['', '   ', '123 456', '日本語のテキスト', max(words, key=len)]
+    for _ in range(count):
+        n_words = rng.choice([1, 5, 20, 100, 300])
+        texts.append(' '.join(rng.choice(words) if rng.random() < 0.85 else rng.choice(noise)
+                              for _ in range(n_words)))
+    if texts_file:
+        with open(texts_file) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    texts.append(f"{record.get('title', '')} {record.get('body', '')}")
+    return texts
+
+def check_parity(reference, compact, texts, rng, random_features=20000):
+    """
+    Compares the model inputs, drift features, isolation forest scores and drift verdicts
+    Returns: dict of mismatch counts (all 0 on parity)
+    """
+    (processor, detector), (compact_processor, compact_detector) = reference, compact
+    features, sequences = analyze_many(processor, detector, texts)
+    compact_features, compact_sequences = analyze_many(compact_processor, compact_detector, texts)
+
+    # Random feature vectors over the observed ranges, to cover the forest beyond the sample texts
+    low, high = features.min(axis=0), features.max(axis=0) + 1
+    probes = np.vstack([features, np.array([[rng.uniform(l, h) for l, h in zip(low, high)]
+                                            for _ in range(random_features)])])
+    scores = detector.model.decision_function(probes)
+    compact_scores = compact_detector.model.decision_function(probes)
+
+    return {'texts': len(texts),
+            'sequence_mismatches': int(np.sum(np.any(sequences != compact_sequences, axis=1))),
+            'single_encode_mismatches': sum(int(np.any(processor.process(text) != compact_processor.process(text)))
+                                            for text in texts),
+            'feature_mismatches': int(np.sum(np.any(features != compact_features, axis=1))),
+            'feature_vectors': len(probes),
+            'score_max_abs_diff': float(np.max(np.abs(scores - compact_scores))),
+            'verdict_mismatches': int(np.sum(detector.model.predict(probes) != compact_detector.model.predict(probes)))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Pickle-free compact artifacts for the backend, with a parity check")
+    parser.add_argument("--data-dir", default="/var/Data_")
+    parser.add_argument("--output", default="/var/Data_/compact")
+    parser.add_argument("--width", type=int, default=24, help="bytes per word in the vocabulary array")
+    parser.add_argument("--texts", type=int, default=2000, help="random texts of the parity check")
+    parser.add_argument("--texts-file", default=None, help="json lines file (requests.jsonl format) of more texts")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    processor = load_pickle(os.path.join(args.data_dir, "preprocess_obj_numpy.pkl"))
+    detector = load_pickle(os.path.join(args.data_dir, "drift_uni_obj.pkl"))
+    pickle_secs = time.perf_counter() - start
+
+    save_compact(processor, detector, args.output, width=args.width)
+    start = time.perf_counter()
+    compact = load_compact(args.output)
+    compact_secs = time.perf_counter() - start
+
+    pickle_bytes = sum(os.path.getsize(os.path.join(args.data_dir, name))
+                       for name in ("preprocess_obj_numpy.pkl", "drift_uni_obj.pkl"))
+    compact_bytes = sum(os.path.getsize(os.path.join(args.output, name)) for name in os.listdir(args.output))
+    logging.info(f"Pickles : {pickle_bytes / 1e6:.1f} MB loaded in {pickle_secs * 1000:.0f} ms, "
+                 f"compact : {compact_bytes / 1e6:.1f} MB loaded in {compact_secs * 1000:.0f} ms")
+
+    # The detector pickle holds its own copy of the vocabulary, the compact artifacts share one
+    detector.preprocessor = processor
+    rng = random.Random(0)
+    report = check_parity((processor, detector), compact, parity_texts(processor, args.texts, rng, args.texts_file), rng)
+    print(json.dumps(report, indent=2))
+
+    mismatches = (report['sequence_mismatches'] + report['single_encode_mismatches'] + report['feature_mismatches']
+                  + report['verdict_mismatches'])
+    if mismatches or report['score_max_abs_diff'] > 0:
+        logging.error("The compact artifacts do not reproduce the pickled ones")
+        sys.exit(1)
+    logging.info(f"Parity checked on {report['texts']} texts and {report['feature_vectors']} feature vectors")
+
+
+if __name__ == "__main__":
+    main()
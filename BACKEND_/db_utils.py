@@ -0,0 +1,336 @@
+## Database utilities for the backend : pooled connections and buffered writes to postgres ##
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection frees up within the pool wait timeout
+    """
+
+
+class QueueFull(Exception):
+    """
+    Raised when the write-behind queue cannot take a row (backpressure)
+    """
+
+
+class ConnectionPool:
+    def __init__(self, connect_fn, min_size=1, max_size=10, wait_timeout=2.0, idle_check_after=30.0,
+                 wait_metric=None, connections_gauge=None, utilization_gauge=None):
+        """
+        connect_fn: Callable returning a new psycopg2 connection (raises psycopg2.OperationalError on failure)
+        min_size: Connections opened at startup and kept idle
+        max_size: Upper bound on open connections (idle + in use)
+        wait_timeout: Seconds a caller waits for a free connection before PoolTimeout
+        idle_check_after: Idle connections older than this are checked with SELECT 1 before reuse
+        wait_metric: Optional prometheus Summary/Histogram observing the wait time in seconds
+        connections_gauge: Optional prometheus Gauge with a 'state' label (idle / in_use)
+        utilization_gauge: Optional prometheus Gauge set to in_use / max_size
+        """
+        self.connect_fn = connect_fn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.idle_check_after = idle_check_after
+        self.wait_metric = wait_metric
+        self.connections_gauge = connections_gauge
+        self.utilization_gauge = utilization_gauge
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = deque()  # (connection, time it was returned)
+        self._in_use = 0
+
+    def open(self):
+        """
+        Opens the min_size connections, failures are logged and retried lazily on acquire
+        """
+        for _ in range(self.min_size - len(self._idle)):
+            try:
+                conn = self.connect_fn()
+            except psycopg2.OperationalError as e:
+                logger.error("Could not pre-open a pooled connection : %s", e)
+                break
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._report()
+
+    def close(self):
+        """
+        Closes the idle connections (connections in use are closed when released)
+        """
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            self._close(conn)
+        self._report()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection : `with pool.connection() as conn: ...`
+        Raises PoolTimeout or psycopg2.OperationalError when no connection can be handed out
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn)
+            raise
+        self.release(conn)
+
+    def acquire(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            self._observe_wait(start)
+            raise PoolTimeout(f"No database connection free within {self.wait_timeout} s")
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = self.connect_fn()
+        except Exception:
+            self._slots.release()
+            self._observe_wait(start)
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        self._observe_wait(start)
+        self._report()
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a borrowed connection, broken connections are dropped
+        """
+        healthy = not conn.closed
+        if healthy and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+        if not healthy:
+            self._close(conn)
+        self._slots.release()
+        self._report()
+
+    def _take_idle(self):
+        """
+        Most recently returned idle connection that passes the health check, None if there is none
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, returned_at = self._idle.pop()
+
+            if not conn.closed and (time.monotonic() - returned_at < self.idle_check_after or self._ping(conn)):
+                return conn
+            logger.warning("Dropping a stale pooled database connection")
+            self._close(conn)
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _observe_wait(self, start):
+        if self.wait_metric is not None:
+            self.wait_metric.observe(time.monotonic() - start)
+
+    def _report(self):
+        with self._lock:
+            idle, in_use = len(self._idle), self._in_use
+        if self.connections_gauge is not None:
+            self.connections_gauge.labels(state="idle").set(idle)
+            self.connections_gauge.labels(state="in_use").set(in_use)
+        if self.utilization_gauge is not None:
+            self.utilization_gauge.set(in_use / self.max_size)
+
+
+class WriteBehindWriter:
+    # Backpressure policies once the queue is full
+    POLICIES = ("block", "reject", "drop_oldest")
+
+    def __init__(self, pool, insert_fns, max_queue=10000, flush_rows=500, flush_interval=1.0,
+                 policy="block", block_timeout=0.5, queue_gauge=None, flush_latency_metric=None,
+                 rows_per_flush_metric=None, dropped_counter=None):
+        """
+        pool: ConnectionPool the flushes borrow their connection from
+        insert_fns: Dict table name -> callable(conn, rows) inserting and committing a list of rows
+        max_queue: Upper bound on rows held in memory (queued + awaiting retry)
+        flush_rows: Flush as soon as this many rows are queued
+        flush_interval: Flush at least every this many seconds when rows are pending
+        policy: 'block' (wait up to block_timeout, then QueueFull), 'reject' (QueueFull at once)
+                or 'drop_oldest' (evict the oldest queued row)
+        queue_gauge: Optional prometheus Gauge set to the number of pending rows
+        flush_latency_metric: Optional prometheus Summary/Histogram observing the flush time in seconds
+        rows_per_flush_metric: Optional prometheus Summary/Histogram observing the rows written per flush
+        dropped_counter: Optional prometheus Counter with a 'reason' label for rows not written
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy!r}, expected one of {self.POLICIES}")
+
+        self.pool = pool
+        self.insert_fns = insert_fns
+        self.max_queue = max_queue
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue_gauge = queue_gauge
+        self.flush_latency_metric = flush_latency_metric
+        self.rows_per_flush_metric = rows_per_flush_metric
+        self.dropped_counter = dropped_counter
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retry = []  # rows of a failed flush, written first on the next one
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def start(self):
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=10.0):
+        """
+        Stops the writer after draining the pending rows
+        """
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        pending = self.pending()
+        if pending:
+            logger.error("Write-behind stopped with %d rows not written", pending)
+
+    def pending(self):
+        return self._queue.qsize() + len(self._retry)
+
+    def put(self, table, row):
+        """
+        Accepts a row for the table, raises QueueFull when the backpressure policy refuses it
+        """
+        if table not in self.insert_fns:
+            raise KeyError(f"No insert function for the table {table}")
+
+        item = (table, row)
+        if self.policy == "block":
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._drop("rejected")
+                raise QueueFull(f"Write-behind queue full ({self.max_queue} rows)")
+        elif self.policy == "reject":
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._drop("rejected")
+                raise QueueFull(f"Write-behind queue full ({self.max_queue} rows)")
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._drop("evicted")
+                    except queue.Empty:
+                        pass
+        self._report()
+
+    def _drop(self, reason, count=1):
+        if self.dropped_counter is not None:
+            self.dropped_counter.labels(reason=reason).inc(count)
+
+    def _report(self):
+        if self.queue_gauge is not None:
+            self.queue_gauge.set(self.pending())
+
+    def _collect(self):
+        """
+        Rows queued until flush_rows are gathered or flush_interval passes
+        """
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch or self._retry:
+                self._flush(batch)
+            if self._stopping.is_set() and self._queue.empty():
+                if self._retry:
+                    # Last attempt for the rows of a failed flush
+                    self._flush([])
+                self._report()
+                return
+
+    def _flush(self, batch):
+        batch = self._retry + batch
+        self._retry = []
+
+        by_table = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+
+        start = time.monotonic()
+        try:
+            with self.pool.connection() as conn:
+                for table, rows in list(by_table.items()):
+                    self.insert_fns[table](conn, rows)
+                    del by_table[table]
+        except Exception as e:
+            failed = [(table, row) for table, rows in by_table.items() for row in rows]
+            logger.error("Write-behind flush failed, %d rows kept for retry : %s", len(failed), e)
+            # Bounded memory : the oldest rows are dropped once the retry backlog exceeds max_queue
+            overflow = len(failed) + self._queue.qsize() - self.max_queue
+            if overflow > 0:
+                self._drop("evicted", overflow)
+                failed = failed[overflow:]
+            self._retry = failed
+            if not self._stopping.is_set():
+                time.sleep(min(self.flush_interval, 1.0))
+            self._report()
+            return
+
+        if self.flush_latency_metric is not None:
+            self.flush_latency_metric.observe(time.monotonic() - start)
+        if self.rows_per_flush_metric is not None:
+            self.rows_per_flush_metric.observe(len(batch))
+        self._report()
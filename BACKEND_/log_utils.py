@@ -0,0 +1,126 @@
+## Log utilities for the backend : byte range / tail reads of the log files and a server-sent events follow ##
+
+import asyncio
+import os
+import re
+import time
+
+# Container names map to /var/log/<name>.log, anything else is rejected (no path components)
+CONTAINER_NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Block size of the backward scan of read_log_tail
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Line breaks ending a data line of a server-sent event
+_SSE_LINE_BREAKS = re.compile(r'\r\n|\r|\n')
+
+
+def log_path(log_dir, container_name):
+    """
+    Path of the log file of a container, None when the name is not a plain container name
+    """
+    if not CONTAINER_NAME_PATTERN.fullmatch(container_name):
+        return None
+    return os.path.join(log_dir, f"{container_name}.log")
+
+def read_log_range(path, offset=0, limit=1024 * 1024):
+    """
+    Complete lines of the log starting at byte offset, at most limit bytes
+    A partial last line (still being written) is left for the next read, a single line longer than
+    limit is returned cut. An offset past the end of the file (rotated or truncated since) restarts at 0
+    Returns: dict of log_text, offset, next_offset (offset of the next read), size, truncated
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        truncated = offset > size
+        if truncated:
+            offset = 0
+        f.seek(offset)
+        data = f.read(min(limit, size - offset))
+
+    end = data.rfind(b'\n') + 1
+    if end == 0 and len(data) == limit:
+        end = len(data)
+    return {'log_text': data[:end].decode('utf-8', errors='replace'),
+            'offset': offset,
+            'next_offset': offset + end,
+            'size': size,
+            'truncated': truncated}
+
+def read_log_tail(path, lines, before=None, max_bytes=1024 * 1024):
+    """
+    Last complete lines of the log (before the byte offset `before` if given), reading backwards
+    block by block so only the returned range (at most max_bytes) is read
+    Returns: same dict as read_log_range, next_offset being where a follow continues
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if before is None else min(before, size)
+        start = end
+        blocks = []
+        newlines = 0
+        # lines complete lines need one more line break in front of them (unless the file starts there)
+        while start > 0 and newlines <= lines and end - start < max_bytes:
+            step = min(TAIL_BLOCK_SIZE, start, max_bytes - (end - start))
+            start -= step
+            f.seek(start)
+            block = f.read(step)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+    data = b''.join(reversed(blocks))
+
+    # Dropping the partial last line, and the partial first one unless the file starts there
+    data = data[:data.rfind(b'\n') + 1]
+    if start > 0:
+        skip = data.find(b'\n') + 1
+        data, start = data[skip:], start + skip
+    parts = data.split(b'\n')
+    if len(parts) - 1 > lines:
+        kept = b'\n'.join(parts[-(lines + 1):])
+        data, start = kept, start + len(data) - len(kept)
+    return {'log_text': data.decode('utf-8', errors='replace'),
+            'offset': start,
+            'next_offset': start + len(data),
+            'size': size,
+            'truncated': False}
+
+def sse_event(data, event_id=None, event=None):
+    """
+    One server-sent event, each line of data becomes a data field
+    """
+    fields = []
+    if event is not None:
+        fields.append(f"event: {event}")
+    if event_id is not None:
+        fields.append(f"id: {event_id}")
+    fields.extend(f"data: {line}" for line in _SSE_LINE_BREAKS.split(data))
+    return '\n'.join(fields) + '\n\n'
+
+async def follow_log(path, offset, is_disconnected, interval=0.5, heartbeat=15.0, max_secs=300.0,
+                     limit=1024 * 1024):
+    """
+    Server-sent events of the lines appended to the log from byte offset on
+    Each event carries the offset after its lines as id, so a reconnecting EventSource resumes from
+    Last-Event-ID. The stream ends after max_secs (the browser reconnects), comments are sent as
+    heartbeats when idle, and a 'truncated' event tells that the file started over
+    is_disconnected: Coroutine function telling whether the client went away
+    """
+    yield f"retry: {int(interval * 2000)}\n\n"
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < max_secs:
+        if await is_disconnected():
+            return
+        chunk = await asyncio.to_thread(read_log_range, path, offset, limit)
+        if chunk['truncated']:
+            yield sse_event("", event_id=0, event="truncated")
+        offset = chunk['next_offset']
+        if chunk['log_text']:
+            yield sse_event(chunk['log_text'].rstrip('\n'), event_id=offset)
+            last_sent = time.monotonic()
+            # More appended than one read returns : no wait before the next one
+            if offset < chunk['size']:
+                continue
+        elif time.monotonic() - last_sent >= heartbeat:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(interval)
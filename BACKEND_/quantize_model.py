@@ -0,0 +1,36 @@
+## Produces the dynamically quantized (int8) variant of the onnx model ##
+
+# Usage (inside the backend container) : python quantize_model.py
+# The backend loads it with MODEL_VARIANT=int8, compare_variants.py reports the accuracy / latency trade-off
+
+import argparse
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def quantize(model_input, model_output, per_channel=False):
+    """
+    Dynamic quantization : the weights are stored as int8, the activations are quantized on the fly
+    """
+    # Imported here, only this tool needs the quantization package (and onnx)
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(model_input, model_output, per_channel=per_channel, weight_type=QuantType.QInt8)
+    logging.info(f"Quantized {model_input} ({os.path.getsize(model_input) / 1e6:.1f} MB) "
+                 f"-> {model_output} ({os.path.getsize(model_output) / 1e6:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic int8 quantization of the onnx model")
+    parser.add_argument("--input", default="/var/Data_/model_best.onnx")
+    parser.add_argument("--output", default="/var/Data_/model_best_int8.onnx")
+    parser.add_argument("--per-channel", action="store_true", help="one scale per output channel of the weights")
+    args = parser.parse_args()
+
+    quantize(args.input, args.output, per_channel=args.per_channel)
+
+
+if __name__ == "__main__":
+    main()
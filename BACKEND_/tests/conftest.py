@@ -0,0 +1,101 @@
+## Shared fixtures of the backend tests : the pickled artifacts of the Data_ volume and a fixed text corpus ##
+
+# Usage (from the BACKEND_ folder, with the Data_ volume at /var/Data_ or DATA_DIR) : python -m pytest tests
+
+import os
+import pickle
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Utils
+
+# The pickles reference the classes from the __main__ module (as in backend_app.py)
+sys.modules['__main__'].TextPreprocessor = Utils.TextPreprocessor
+sys.modules['__main__'].DriftDetector = Utils.DriftDetector
+
+DATA_DIR = os.getenv('DATA_DIR', '/var/Data_')
+
+# Unicode (accents, ligatures, full width, non latin scripts, emoji, invisible spaces), empty and blank
+# inputs, digits and punctuation, stop words only, inflected words and transliterated text
+CORPUS = [
+    "",
+    "   ",
+    "\n\t\r",
+    "123 456 !!! ??? ...",
+    "I can't sleep anymore, nothing matters.",
+    "RUNNING Runs ran runner's better BEST cats Dogs",
+    "the and of to is was were been being",
+    "Ça va très bien, naïve café crème brûlée",
+    "İstanbul ǅungla ﬁne ＡＢＣ ß straße",
+    "मुझे नींद नहीं आती",
+    "日本語のテキスト and some english words",
+    "feeling 😢 so 💔 alone tonight",
+    "mixed non breaking​zero​width spaces",
+    "tum nahi ho zindagi kya hai mera",
+    "abc123 x9y hello_world foo-bar e-mail o'clock",
+]
+
+
+def load_pickle(name):
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        pytest.skip(f"{path} not found (set DATA_DIR to the Data_ folder)")
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def stub_lemmatize(self, word, pos='n'):
+    """
+    Stand-in for the WordNet lookup (strips a plural s), needs no NLTK data
+    """
+    return word[:-1] if len(word) > 3 and word.endswith('s') else word
+
+@pytest.fixture(scope="session", params=["wordnet", "stub"])
+def lemmatizer(request):
+    """
+    Lemmatization the tests run with : the WordNet corpus (skipped when not installed), then a stub
+    patched into WordNetLemmatizer, so the parity is checked without any NLTK data
+    """
+    from nltk.stem import WordNetLemmatizer
+    if request.param == "wordnet":
+        try:
+            WordNetLemmatizer().lemmatize("tests")
+        except LookupError:
+            pytest.skip("NLTK wordnet corpus not found in the NLTK_DATA paths")
+        yield request.param
+    else:
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(WordNetLemmatizer, "lemmatize", stub_lemmatize)
+            yield request.param
+
+@pytest.fixture(scope="session")
+def processor(lemmatizer):
+    return load_pickle("preprocess_obj_numpy.pkl")
+
+@pytest.fixture(scope="session")
+def detector(processor):
+    detector = load_pickle("drift_uni_obj.pkl")
+    # The detector pickle holds its own copy of the vocabulary, the backend shares the preprocessor's
+    detector.preprocessor = processor
+    return detector
+
+@pytest.fixture(scope="session")
+def corpus(processor):
+    """
+    CORPUS plus texts longer than max_len tokens and seeded random texts over the vocabulary
+    """
+    rng = random.Random(0)
+    words = list(processor.vocab)
+    noise = ['nahi', 'hai', 'Hello,', 'WORLD!!', 'abc123', 'ñandú', '日本語', 'İstanbul', 'qwzxv', '😢']
+    texts = list(CORPUS)
+    texts.append(' '.join(words[:processor.max_len * 3]))
+    texts.append("hello world " * processor.max_len * 2)
+    texts.append(max(words, key=len))
+    for _ in range(200):
+        n_words = rng.choice([1, 5, 20, 100, 300])
+        texts.append(' '.join(rng.choice(words) if rng.random() < 0.85 else rng.choice(noise)
+                              for _ in range(n_words)))
+    return texts
@@ -0,0 +1,70 @@
+## Parity of the compact pickle-free artifacts (save_compact / load_compact) with the pickled ones ##
+
+import numpy as np
+import pytest
+
+from Utils import FlatIsolationForest, analyze_many, load_compact, save_compact
+
+
+@pytest.fixture(scope="module")
+def compact(processor, detector, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("compact"))
+    save_compact(processor, detector, directory)
+    return load_compact(directory)
+
+@pytest.fixture(scope="module")
+def probes(processor, detector, corpus):
+    """
+    Drift features of the corpus plus seeded random feature vectors over their ranges,
+    to cover the forest beyond the sample texts
+    """
+    features = detector.extract_features_many(corpus)
+    rng = np.random.default_rng(0)
+    low, high = features.min(axis=0), features.max(axis=0) + 1
+    return np.vstack([features, rng.uniform(low, high, size=(20000, features.shape[1]))])
+
+
+def test_vocab_lookups_identical(processor, compact):
+    compact_processor, _ = compact
+    words = list(processor.vocab)
+    # Unknown words : empty, non ASCII, longer than the table width, case and plural variants
+    unknown = ['', 'qwzxv', 'ñandú', '日本語', 'x' * 100, words[0].upper(), words[0] + 's', max(words, key=len) + 'x']
+    assert compact_processor.vocab.lookup(words + unknown).tolist() == [processor.vocab.get(word, 0)
+                                                                        for word in words + unknown]
+    assert list(compact_processor.vocab) == words
+    assert len(compact_processor.vocab) == len(processor.vocab)
+
+def test_sequences_identical(processor, detector, compact, corpus):
+    compact_processor, compact_detector = compact
+    _, sequences = analyze_many(processor, detector, corpus)
+    _, compact_sequences = analyze_many(compact_processor, compact_detector, corpus)
+    np.testing.assert_array_equal(sequences, compact_sequences)
+    np.testing.assert_array_equal(processor.process_batch(corpus), compact_processor.process_batch(corpus))
+    for text in corpus:
+        np.testing.assert_array_equal(processor.process(text), compact_processor.process(text), err_msg=text[:80])
+
+def test_drift_features_identical(processor, detector, compact, corpus):
+    compact_processor, compact_detector = compact
+    features, _ = analyze_many(processor, detector, corpus)
+    compact_features, _ = analyze_many(compact_processor, compact_detector, corpus)
+    np.testing.assert_array_equal(features, compact_features)
+    np.testing.assert_array_equal(detector.extract_features_many(corpus),
+                                  compact_detector.extract_features_many(corpus))
+
+def test_decision_function_identical(detector, compact, probes):
+    _, compact_detector = compact
+    np.testing.assert_array_equal(detector.model.decision_function(probes),
+                                  compact_detector.model.decision_function(probes))
+
+def test_verdicts_identical(detector, compact, probes):
+    _, compact_detector = compact
+    np.testing.assert_array_equal(detector.model.predict(probes), compact_detector.model.predict(probes))
+    np.testing.assert_array_equal(detector.is_drifted_features(probes), compact_detector.is_drifted_features(probes))
+    # Both verdicts occur, otherwise the comparison above proves little
+    assert set(np.unique(detector.model.predict(probes))) == {-1, 1}
+
+def test_flat_forest_from_sklearn_identical(detector, probes):
+    # The forest the backend flattens from the pickle when there are no compact artifacts
+    flat = FlatIsolationForest.from_sklearn(detector.model)
+    np.testing.assert_array_equal(detector.model.decision_function(probes), flat.decision_function(probes))
+    np.testing.assert_array_equal(detector.model.predict(probes), flat.predict(probes))
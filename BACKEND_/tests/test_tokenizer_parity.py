@@ -0,0 +1,52 @@
+## Parity of the fused tokenizer (tokenize / encode) with the original cleaning and sequencing path ##
+
+import re
+
+import numpy as np
+
+
+def legacy_clean_text(processor, text):
+    """
+    clean_text as written before the fused tokenizer
+    """
+    text = re.sub(r'[^a-zA-Z]', ' ', text)
+    text = text.lower()
+    text = text.split()
+    text = [processor.lemmatizer.lemmatize(word) for word in text if word not in processor.stop_words]
+    return ' '.join(text)
+
+def legacy_sequence(processor, text):
+    """
+    clean_text -> text_to_sequence -> pad_sequence, as process did before the fused tokenizer
+    """
+    return processor.pad_sequence(processor.text_to_sequence(legacy_clean_text(processor, text)))
+
+
+def test_clean_text_matches_legacy(processor, corpus):
+    for text in corpus:
+        assert processor.clean_text(text) == legacy_clean_text(processor, text), text[:80]
+
+def test_tokenize_matches_legacy(processor, corpus):
+    for text in corpus:
+        assert processor.tokenize(text) == legacy_clean_text(processor, text).split(), text[:80]
+
+def test_process_matches_legacy(processor, corpus):
+    for text in corpus:
+        sequence = processor.process(text)
+        assert sequence.shape == (1, processor.max_len) and sequence.dtype == np.int64
+        np.testing.assert_array_equal(sequence[0], legacy_sequence(processor, text), err_msg=text[:80])
+
+def test_process_batch_matches_legacy(processor, corpus):
+    batch = processor.process_batch(corpus)
+    assert batch.shape == (len(corpus), processor.max_len) and batch.dtype == np.int64
+    np.testing.assert_array_equal(batch, np.stack([legacy_sequence(processor, text) for text in corpus]))
+
+def test_corpus_covers_edge_cases(processor, corpus):
+    # Guards the corpus itself : empty inputs, non ASCII text and inputs truncated at max_len
+    token_counts = [len(legacy_clean_text(processor, text).split()) for text in corpus]
+    assert 0 in token_counts
+    assert max(token_counts) > processor.max_len
+    assert any(not text.isascii() for text in corpus)
+
+def test_process_batch_empty(processor):
+    assert processor.process_batch([]).shape == (0, processor.max_len)
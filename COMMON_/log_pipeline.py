@@ -0,0 +1,366 @@
+## Logging pipeline of the apps : records queued on the request path, formatted and written by a background thread ##
+
+# Shared by the backend and the frontend : copied into both images from the "common" build context
+# (see docker-compose.yml), imported from COMMON_ when the apps run from the repository
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler
+
+# Line format of LOG_FORMAT=text (the format the apps used before the JSON lines)
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Whether the DEBUG / INFO records of the current request are kept (see LogSampler)
+log_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+# Attributes every record has, the other ones were passed with extra= and are added to the JSON line
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line : time (UTC), level, logger, request id, message, the extra= fields and the traceback
+    """
+    def __init__(self):
+        super().__init__()
+        self._encoder = json.JSONEncoder(default=str)
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record):
+        # The date part only changes once per second
+        second = int(record.created)
+        if second != self._second:
+            self._second, self._second_text = second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        entry = {"time": f"{self._second_text}.{int(record.msecs):03d}Z",
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "request_id": getattr(record, "request_id", "-"),
+                 "message": record.getMessage()}
+        for key in record.__dict__.keys() - _RECORD_ATTRS:
+            entry[key] = record.__dict__[key]
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return self._encoder.encode(entry)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the id of the current request to the records ('-' outside of a request) and drops the DEBUG / INFO
+    ones of the requests left out by the sampling (warnings and errors are always kept)
+    """
+    def __init__(self, request_id_var):
+        super().__init__()
+        self.request_id_var = request_id_var
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and not log_sampled.get():
+            return False
+        record.request_id = self.request_id_var.get()
+        return True
+
+
+def parse_sample_rates(spec):
+    """
+    Per endpoint sampling rates from "path=rate,path=rate" (e.g. "/predict=0.1,/logs=0")
+    """
+    rates = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        path, _, rate = part.partition("=")
+        rate = float(rate)
+        if not path.strip().startswith("/") or not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Invalid log sampling rate {part!r}, expected /path=<rate between 0 and 1>")
+        rates[path.strip()] = rate
+    return rates
+
+
+class LogSampler:
+    def __init__(self, rates=None, default=1.0):
+        """
+        Decides once per request whether its DEBUG / INFO records are kept, so a request is logged whole or not at all
+        rates: Dict of path prefix -> fraction of the requests logged (the longest matching prefix applies)
+        default: Fraction of the other requests logged
+        """
+        self.default = default
+        self._prefixes = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def sample(self, path):
+        rate = self.default
+        for prefix, prefix_rate in self._prefixes:
+            if path.startswith(prefix):
+                rate = prefix_rate
+                break
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts the records in the bounded queue of the writer thread. Nothing is formatted or written on the
+    caller side, and a record is dropped (and counted) rather than waited for when the queue is full
+    wake: Event waking the writer early (errors, queue half full), it otherwise polls the queue
+    """
+    def __init__(self, log_queue, wake, dropped_counter=None):
+        super().__init__(log_queue)
+        self.wake = wake
+        self.wake_size = log_queue.maxsize // 2
+        self.dropped_counter = dropped_counter
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def handle(self, record):
+        # The queue is thread safe, the handler lock taken by logging.Handler.handle is not needed
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def prepare(self, record):
+        # The arguments are merged now (they may change once the call returns), the traceback is rendered
+        # now (its frames are released), the rest of the formatting is left to the writer thread
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped_counter is not None:
+                self.dropped_counter.inc()
+            self.wake.set()
+            return
+        # Waking the writer for every record would cost a thread switch per log call
+        if record.levelno >= logging.ERROR or len(self.queue.queue) >= self.wake_size:
+            self.wake.set()
+
+
+class RotatingLogFile:
+    def __init__(self, path, max_bytes=0, max_secs=0.0, backup_count=3):
+        """
+        Log file rotated once a write would take it past max_bytes or once it is max_secs old (0 disables either),
+        keeping backup_count older files (<path>.1 being the newest, 0 truncates instead). A batch of the
+        writer is never split, so a file can exceed max_bytes by less than one batch
+        A file rotated by another process (pre-forked workers) is reopened before the next write
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_secs = max_secs
+        self.backup_count = backup_count
+        self._stream = None
+        self._open("a")
+
+    def _open(self, mode):
+        self._stream = open(self.path, mode, encoding="utf-8")
+        self._opened_at = time.time()
+
+    def write(self, data):
+        stat = os.fstat(self._stream.fileno())
+        try:
+            current = os.stat(self.path)
+            rotated_elsewhere = (current.st_ino, current.st_dev) != (stat.st_ino, stat.st_dev)
+        except FileNotFoundError:
+            rotated_elsewhere = True
+        if rotated_elsewhere:
+            self._stream.close()
+            self._open("a")
+        elif stat.st_size > 0 and ((self.max_bytes and stat.st_size + len(data) > self.max_bytes) or
+                                   (self.max_secs and time.time() - self._opened_at >= self.max_secs)):
+            self.rotate()
+        self._stream.write(data)
+        self._stream.flush()
+
+    def rotate(self):
+        self._stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            try:
+                os.replace(self.path, f"{self.path}.1")
+            except FileNotFoundError:
+                # Rotated by another process in the meantime
+                pass
+            self._open("a")
+        else:
+            self._open("w")
+
+    def close(self):
+        self._stream.close()
+
+
+class StreamOutput:
+    """
+    Console output of the writer (stdout, collected by the docker logging driver)
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class LogWriter:
+    def __init__(self, formatter, outputs, queue_size=10000, flush_interval=0.1, batch_size=512,
+                 dropped_counter=None):
+        """
+        Background thread writing the queued records in batches : each output gets one write and one flush
+        per batch instead of one per record
+        formatter: logging.Formatter of the lines
+        outputs: Objects with write(text) / close() (RotatingLogFile, StreamOutput)
+        queue_size: Records waiting at most, the ones logged beyond that are dropped
+        flush_interval: Seconds between two checks of the queue (errors and a queue half full are written at once)
+        dropped_counter: Optional prometheus Counter of the dropped records
+        """
+        self.formatter = formatter
+        self.outputs = outputs
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size), threading.Event(), dropped_counter)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, args=(self.handler.queue, self.handler.wake),
+                                        name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Writes the records still queued, then closes the outputs
+        """
+        if self._thread is None:
+            return
+        try:
+            self.handler.queue.put(None, timeout=timeout)
+            self.handler.wake.set()
+            self._thread.join(timeout)
+        except queue.Full:
+            pass
+        self._thread = None
+        for output in self.outputs:
+            output.close()
+
+    def drain(self):
+        """
+        Waits until every record queued so far is written
+        """
+        self.handler.wake.set()
+        self.handler.queue.join()
+
+    def restart_after_fork(self):
+        # The thread of the parent does not exist in a forked child, and the queue locks may have been
+        # held by it at fork time : the child gets a new queue, event and thread
+        self.handler.queue = queue.Queue(maxsize=self.queue_size)
+        self.handler.wake = threading.Event()
+        self.start()
+
+    def _run(self, log_queue, wake):
+        stopping = False
+        while not stopping:
+            wake.wait(self.flush_interval)
+            wake.clear()
+            while True:
+                records = []
+                try:
+                    while len(records) < self.batch_size:
+                        records.append(log_queue.get_nowait())
+                except queue.Empty:
+                    pass
+                if not records:
+                    break
+                stopping = self._write(records) or stopping
+                for _ in records:
+                    log_queue.task_done()
+
+    def _write(self, records):
+        """
+        Formats and writes a batch, True when it holds the stop marker
+        """
+        lines = []
+        stopping = False
+        for record in records:
+            if record is None:
+                stopping = True
+                continue
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f"Log record {record.msg!r} not formatted : {e}")
+        if lines:
+            data = "\n".join(lines) + "\n"
+            for output in self.outputs:
+                try:
+                    output.write(data)
+                except Exception as e:
+                    sys.stderr.write(f"Log write to {output} failed : {e}\n")
+        return stopping
+
+
+def lean_log_records():
+    """
+    Stops the logging module from looking up, for every record, the attributes neither format writes :
+    caller frame, thread, process and asyncio task names. Record creation is the main cost left on the
+    caller side, but these are module globals (logging._srcfile is private) : for every logger of the process,
+    libraries included, %(funcName)s / %(lineno)d / %(threadName)s / %(process)d ... then hold placeholders
+    """
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+
+
+def setup_logging(log_file, request_id_var, level="DEBUG", fmt="json", rotate_bytes=0, rotate_secs=0.0,
+                  backup_count=3, queue_size=10000, flush_interval=0.1, stream=sys.stdout, dropped_counter=None,
+                  lean_records=False):
+    """
+    Routes the records of all loggers through the non-blocking queue handler to a LogWriter thread,
+    writing to the rotated log_file and to stream (None for the file only)
+    fmt: 'json' (one JSON object per line) or 'text' (TEXT_FORMAT)
+    lean_records: Calls lean_log_records (off by default : it changes the records of the whole process)
+    Returns: the LogWriter (stopped at exit, restarted in forked children)
+    """
+    if fmt not in ("json", "text"):
+        raise ValueError(f"Unknown log format {fmt!r}, expected 'json' or 'text'")
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    outputs = [RotatingLogFile(log_file, rotate_bytes, rotate_secs, backup_count)]
+    if stream is not None:
+        outputs.append(StreamOutput(stream))
+
+    writer = LogWriter(formatter, outputs, queue_size, flush_interval, dropped_counter=dropped_counter)
+    writer.handler.addFilter(RequestContextFilter(request_id_var))
+    if lean_records:
+        lean_log_records()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(writer.handler)
+    root.setLevel(level)
+
+    writer.start()
+    atexit.register(writer.stop)
+    os.register_at_fork(after_in_child=writer.restart_after_fork)
+    return writer
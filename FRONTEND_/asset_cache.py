@@ -0,0 +1,161 @@
+## Static asset cache of the frontend : pages, styles and script held in memory, precompressed ##
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from email.utils import formatdate
+
+# brotli is optional, the assets are then served with gzip only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# An asset : its bodies per content coding ('identity', 'gzip', 'br'), validators and (mtime, size) version
+Asset = namedtuple('Asset', ['media_type', 'bodies', 'etag', 'last_modified', 'version'])
+
+# Content codings in order of preference when the client accepts several with the same weight
+PREFERRED_CODINGS = ('br', 'gzip', 'identity')
+
+
+def accepted_coding(accept_encoding, available):
+    """
+    Content coding to answer with, from the Accept-Encoding header (q-values honoured, identity as fallback)
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = "identity", 0.0
+    for coding in PREFERRED_CODINGS:
+        if coding not in available:
+            continue
+        weight = weights.get(coding, weights.get("*", 1.0 if coding == "identity" else 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class StaticAssetCache:
+    def __init__(self, directory, files, gzip_level=9, brotli_quality=11, min_size=256):
+        """
+        directory: Folder of the assets
+        files: Dict of file name -> media type
+        gzip_level / brotli_quality: Compression settings, paid once per (re)load
+        min_size: Files smaller than this are only served uncompressed
+        """
+        self.directory = directory
+        self.files = files
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.min_size = min_size
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        """
+        Reads and compresses one file (blocking, run at startup or from a worker thread)
+        """
+        path = os.path.join(self.directory, name)
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        bodies = {'identity': data}
+        if len(data) >= self.min_size:
+            compressed = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+            if len(compressed) < len(data):
+                bodies['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=self.brotli_quality)
+                if len(compressed) < len(data):
+                    bodies['br'] = compressed
+
+        asset = Asset(media_type=self.files[name],
+                      bodies=bodies,
+                      etag=hashlib.blake2b(data, digest_size=16).hexdigest(),
+                      last_modified=formatdate(stat.st_mtime, usegmt=True),
+                      version=(stat.st_mtime_ns, stat.st_size))
+        with self._lock:
+            self._assets[name] = asset
+        logger.info("Static asset %s loaded : %s", name,
+                    ", ".join(f"{coding} {len(body)} bytes" for coding, body in bodies.items()))
+        return asset
+
+    def load_all(self):
+        for name in self.files:
+            self.load(name)
+
+    def refresh(self):
+        """
+        Reloads the files whose modification time or size changed, returns their names
+        """
+        reloaded = []
+        for name in self.files:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError as e:
+                logger.error("Static asset %s cannot be checked : %s", name, e)
+                continue
+            asset = self._assets.get(name)
+            if asset is None or asset.version != (stat.st_mtime_ns, stat.st_size):
+                self.load(name)
+                reloaded.append(name)
+        return reloaded
+
+    async def watch(self, interval=1.0):
+        """
+        Checks the files for changes every interval seconds, off the event loop
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error("Static asset refresh failed : %s", e)
+
+    def get(self, name):
+        """
+        Asset held in memory (KeyError when the name is not one of the files)
+        """
+        return self._assets[name]
+
+    def variant(self, name, accept_encoding=None, if_none_match=None):
+        """
+        (status, body, headers) of the asset for a request : 304 with an empty body when the client
+        copy is still current, else the body in the accepted content coding
+        """
+        asset = self.get(name)
+        coding = accepted_coding(accept_encoding, asset.bodies)
+        # Each coding is its own representation, hence its own entity tag
+        etag = f'"{asset.etag}"' if coding == 'identity' else f'"{asset.etag}-{coding}"'
+        headers = {"ETag": etag,
+                   "Last-Modified": asset.last_modified,
+                   "Cache-Control": "no-cache",
+                   "Vary": "Accept-Encoding"}
+
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+            if "*" in tags or any(tag.split("-")[0] == asset.etag for tag in tags):
+                return 304, b"", headers
+
+        if coding != 'identity':
+            headers["Content-Encoding"] = coding
+        return 200, asset.bodies[coding], headers
@@ -1,19 +1,32 @@
 # FrontEnd Application using FastAPI #
 
-from fastapi import FastAPI, Request, HTTPException, APIRouter
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, APIRouter, Query
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, constr, conlist
 from prometheus_client import Summary, start_http_server, Counter, Gauge, Info
 from prometheus_client import disable_created_metrics
 import os
+import re
+import sys
+import uuid
+import contextvars
 from starlette.responses import Response
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
 import asyncio
+import time
 import uvicorn
 from typing import Optional, List
 import logging
 import httpx
+from asset_cache import StaticAssetCache
+from proxy_cache import SingleFlightCache, CachedResponse
+from history_store import HistoryStore, HistoryWriter
+# log_pipeline.py is shared with the backend : next to the app in the image, in COMMON_ in the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "COMMON_"))
+from log_pipeline import setup_logging, parse_sample_rates, LogSampler, log_sampled
 
 # Creating useful prometheus metrics
 # disabling the created metrics
@@ -28,16 +41,104 @@ api_usage = Summary('api_runtime_fe', 'api run time monitoring')
 api_counter_be = Counter('api_call_counter_be', 'number of times that API is called', ['endpoint', 'client'])
 api_counter = Counter('api_call_counter_fe', 'number of times that API is called', ['endpoint', 'client'])
 api_gauge = Gauge('api_runtime_secs_fe', 'runtime of the method in seconds', ['endpoint', 'client']) 
+history_db_rows = Counter('history_db_rows_fe', 'analysis history rows written to / dropped before postgres',
+                          ['result'])
+log_records_dropped = Counter('log_records_dropped_fe', 'log records dropped (log writer queue full)')
+proxy_cache_events = Counter('proxy_cache_events_fe', 'cache events of the proxied backend GETs '
+                             '(hit / miss / coalesced / eviction)', ['route', 'event'])
 
 # adding build information to the info metric.
 info = Info('my_build', 'Prometheus Instrumented AI App for Suicide Detection')
 info.info({'version': '0.0.1', 'buildhost': '@Instinct', 'author': 'Joel J @ IITM', 'builddate': 'April 2025'})
 
-# Get the backend URL
-#BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:4000")
+# Get the backend URL (docker network name of the backend service)
+BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:4000")
+
+# Connection pool of the upstream client (kept alive for the app lifetime)
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", 100))
+BACKEND_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", 20))
+BACKEND_KEEPALIVE_EXPIRY = float(os.getenv("BACKEND_KEEPALIVE_EXPIRY", 30))
+
+# Timeouts (seconds) of the proxied backend routes
+BACKEND_TIMEOUTS = {
+    "/predict": httpx.Timeout(5),
+    "/feedback": httpx.Timeout(5),
+    "/diagnostic": httpx.Timeout(5),
+    "/visualizations": httpx.Timeout(10, connect=5),
+    "/logs": httpx.Timeout(10, connect=5),
+    # Server-sent events : the backend sends a heartbeat at least every 15 s while idle
+    "/logs/follow": httpx.Timeout(10, connect=5, read=60),
+}
+
+# Names relayed as one backend path segment (log container names, plot names)
+PATH_NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Conditional request headers relayed to the backend, so that unchanged images cost a 304
+VALIDATOR_HEADERS = ("if-none-match", "if-modified-since")
+
+# Proxied backend GETs (visualizations, logs) : seconds an answer is reused (0 only coalesces
+# concurrent identical calls), and the bounds of the answers kept
+PROXY_CACHE_TTL = float(os.getenv("PROXY_CACHE_TTL", 2))
+PROXY_CACHE_MAX_ENTRIES = int(os.getenv("PROXY_CACHE_MAX_ENTRIES", 128))
+PROXY_CACHE_MAX_BYTES = int(os.getenv("PROXY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Analysis history : analyses kept in memory, eviction policy (fifo, lru or unsaved_first),
+# default and largest page of /api/history
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", 10000))
+HISTORY_EVICTION = os.getenv("HISTORY_EVICTION", "unsaved_first")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", 200))
+# Largest analysis accepted by POST /api/history : characters of the analysed message and of each
+# recommendation, number of recommendations (the result is a risk label)
+HISTORY_MESSAGE_MAX_CHARS = int(os.getenv("HISTORY_MESSAGE_MAX_CHARS", 10000))
+HISTORY_RECOMMENDATION_MAX_CHARS = int(os.getenv("HISTORY_RECOMMENDATION_MAX_CHARS", 1000))
+HISTORY_RECOMMENDATIONS_MAX = int(os.getenv("HISTORY_RECOMMENDATIONS_MAX", 20))
+HISTORY_RESULT_MAX_CHARS = 64
+# Optional persistence of the history to postgres (POSTGRES_* settings as in the backend),
+# written in batches of HISTORY_BATCH_SIZE rows or every HISTORY_FLUSH_INTERVAL seconds
+HISTORY_DB_ENABLED = os.getenv("HISTORY_DB_ENABLED", "0") == "1"
+HISTORY_TABLE = os.getenv("HISTORY_TABLE", "analysis_history")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 100))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 1))
+
+# Seconds between two checks of the static assets for changes on disk
+STATIC_CHECK_INTERVAL = float(os.getenv("STATIC_CHECK_INTERVAL", 1))
+
+# Connection specific headers that must not be relayed by a proxy (RFC 7230 section 6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+})
+
+# One upstream client for the app lifetime, so proxied calls reuse keep-alive connections
+backend_client = httpx.AsyncClient(
+    base_url=BACKEND_URL,
+    timeout=httpx.Timeout(5),
+    limits=httpx.Limits(max_connections=BACKEND_MAX_CONNECTIONS,
+                        max_keepalive_connections=BACKEND_MAX_KEEPALIVE,
+                        keepalive_expiry=BACKEND_KEEPALIVE_EXPIRY),
+)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Reloading the static assets changed on disk, from a worker thread
+    watcher = asyncio.create_task(asset_cache.watch(STATIC_CHECK_INTERVAL))
+    if history_store.writer is not None:
+        try:
+            await asyncio.to_thread(start_history_writer)
+        except Exception as e:
+            logger.error("History persistence unavailable, keeping the history in memory only : %s", e)
+            history_store.writer = None
+    yield
+    watcher.cancel()
+    if history_store.writer is not None:
+        # Writing the analyses still queued
+        await asyncio.to_thread(history_store.writer.stop)
+    # Closing the pooled upstream connections
+    await backend_client.aclose()
 
 # Create FastAPI app
-app = FastAPI(title="AI Application for Suicide Detection (via text)")
+app = FastAPI(title="AI Application for Suicide Detection (via text)", lifespan=lifespan)
 router = APIRouter()
 
 # Mount the static files
@@ -68,24 +169,92 @@ class input_diagnostic(BaseModel):
     text : str
     label : str
 
-# Simulated analyses database
-analyses_db = []
-current_id = 1
-
-# Setting up the logging 
+class input_analysis(BaseModel):
+    message : constr(max_length=HISTORY_MESSAGE_MAX_CHARS)
+    result : constr(max_length=HISTORY_RESULT_MAX_CHARS)
+    confidence : Optional[float] = None
+    recommendations : Optional[conlist(constr(max_length=HISTORY_RECOMMENDATION_MAX_CHARS),
+                                       max_length=HISTORY_RECOMMENDATIONS_MAX)] = None
+    savedToHistory : bool = False
+
+def connect_history_db():
+    import psycopg2
+    return psycopg2.connect(dbname=os.getenv('POSTGRES_DB', 'postgres'),
+                            user=os.getenv('POSTGRES_USER', 'postgres'),
+                            password=os.getenv('POSTGRES_PASSWORD', 'postgres'),
+                            host=os.getenv('POSTGRES_HOST', 'postgres_db'),
+                            port=int(os.getenv('POSTGRES_PORT', 5432)))
+
+# Analyses by id, bounded, persisted in batches when HISTORY_DB_ENABLED
+history_store = HistoryStore(max_entries=HISTORY_MAX_ENTRIES, policy=HISTORY_EVICTION,
+                             writer=HistoryWriter(connect_history_db, table=HISTORY_TABLE,
+                                                  batch_size=HISTORY_BATCH_SIZE,
+                                                  flush_interval=HISTORY_FLUSH_INTERVAL,
+                                                  rows_counter=history_db_rows) if HISTORY_DB_ENABLED else None)
+
+def start_history_writer():
+    """
+    Reloads the newest persisted analyses (ids continue after them) and starts the batched writer
+    """
+    writer = history_store.writer
+    history_store.load(writer.load_recent(HISTORY_MAX_ENTRIES))
+    writer.start()
+    logger.info("History persistence to '%s' started, %d analyses reloaded", HISTORY_TABLE, len(history_store))
+
+# Id of the request, forwarded to the backend as X-Request-ID so one call can be followed in both logs
+request_id_var = contextvars.ContextVar('request_id', default='-')
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+# Setting up the logging : records queued on the request path and written as JSON lines (LOG_FORMAT=text
+# for the plain format) by a background thread to the rotated log file and stdout. LOG_SAMPLE_RATES keeps
+# the DEBUG / INFO lines of a fraction of the requests per path prefix ("/backend/predict=0.1,/static=0")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", 10 * 1024 * 1024))
+LOG_ROTATE_SECS = float(os.getenv("LOG_ROTATE_SECS", 0))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 3))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+LOG_SAMPLE_DEFAULT = float(os.getenv("LOG_SAMPLE_DEFAULT", 1))
+# Opt-in : no caller / thread / process lookups per record, for every logger of the process
+LOG_LEAN_RECORDS = os.getenv("LOG_LEAN_RECORDS", "0") == "1"
 log_file = "/var/log/frontend.log"
-logging.basicConfig(
-    level = logging.DEBUG,
-    format = "%(asctime)s - %(levelname)s - %(message)s",
-    handlers = [
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+log_writer = setup_logging(log_file, request_id_var,
+                           level=LOG_LEVEL,
+                           fmt=LOG_FORMAT,
+                           rotate_bytes=LOG_ROTATE_BYTES,
+                           rotate_secs=LOG_ROTATE_SECS,
+                           backup_count=LOG_BACKUP_COUNT,
+                           queue_size=LOG_QUEUE_SIZE,
+                           lean_records=LOG_LEAN_RECORDS,
+                           dropped_counter=log_records_dropped)
+log_sampler = LogSampler(LOG_SAMPLE_RATES, LOG_SAMPLE_DEFAULT)
 logger = logging.getLogger(__name__)
 
 logger.info("The Backend is starting now !!!")
 
+# Pages, styles and script held in memory and precompressed (loaded here, reloaded when they change)
+asset_cache = StaticAssetCache(".", {
+    "index.html": "text/html; charset=utf-8",
+    "feedback.html": "text/html; charset=utf-8",
+    "diagnostic.html": "text/html; charset=utf-8",
+    "visualizations.html": "text/html; charset=utf-8",
+    "logs.html": "text/html; charset=utf-8",
+    "contact.html": "text/html; charset=utf-8",
+    "styles.css": "text/css; charset=utf-8",
+    "script.js": "text/javascript; charset=utf-8",
+})
+asset_cache.load_all()
+
+def static_response(request, name):
+    """
+    Cached asset in the content coding the client accepts, 304 when its copy is still current
+    """
+    status, body, headers = asset_cache.variant(name, request.headers.get("accept-encoding"),
+                                                request.headers.get("if-none-match"))
+    media_type = asset_cache.get(name).media_type if status == 200 else None
+    return Response(content=body, status_code=status, media_type=media_type, headers=headers)
+
 """
 @app.get("/config")
 async def get_config(request:Request):
@@ -97,64 +266,139 @@ async def get_config(request:Request):
 async def get_home(request:Request):
     logging.info("Calling the Dashboard API ")
     api_counter.labels(endpoint = "/main", client=request.client.host).inc()
-    with open("index.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "index.html")
 
 @app.get("/main", response_class=HTMLResponse)
 async def get_main(request:Request):
     logging.info("Calling the Dashboard API ")
     api_counter.labels(endpoint = "/main", client=request.client.host).inc()
-    with open("index.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "index.html")
 
 # Serve the feedback HTML page
 @app.get("/feedback", response_class=HTMLResponse)
 async def get_feedback(request:Request):
     logging.info("Calling the Dashboard Feedback API ")
     api_counter.labels(endpoint = "/feedback", client=request.client.host).inc()
-    with open("feedback.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "feedback.html")
 
 # Serve the diagnostic HTML page
 @app.get("/diagnostic", response_class=HTMLResponse)
 async def get_diagnostic(request:Request):
     logging.info("Calling the Dashboard Diagnostic API ")
     api_counter.labels(endpoint = "/diagnostic", client=request.client.host).inc()
-    with open("diagnostic.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "diagnostic.html")
 
 # Serve the visualizations HTML page
 @app.get("/visualizations", response_class=HTMLResponse)
 async def get_visualizations(request:Request):
     logging.info("Calling the Dashboard Visualization API ")
     api_counter.labels(endpoint = "/visualization", client=request.client.host).inc()
-    with open("visualizations.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "visualizations.html")
 
 # Serve the visualizations HTML page
 @app.get("/logs", response_class=HTMLResponse)
 async def get_logs(request:Request):
     logging.info("Calling the Dashboard  LogsAPI ")
     api_counter.labels(endpoint = "/logs", client=request.client.host).inc()
-    with open("logs.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "logs.html")
 
 # Serve the contact HTML page
 @app.get("/contact", response_class=HTMLResponse)
 async def get_contact(request:Request):
     logging.info("Calling the Dashboard contact API ")
     api_counter.labels(endpoint = "/contact", client=request.client.host).inc()
-    with open("contact.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    return static_response(request, "contact.html")
+
+@app.middleware("http")
+async def tag_request_id(request: Request, call_next):
+    """
+    Gives each call an id (kept if the client sent a valid X-Request-ID) for the logs, the backend and the response
+    """
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    sampled_token = log_sampled.set(log_sampler.sample(request.scope["path"]))
+    try:
+        start = time.perf_counter()
+        response = await call_next(request)
+        logger.info("%s %s -> %d in %.1f ms", request.method, request.scope["path"], response.status_code,
+                    (time.perf_counter() - start) * 1000)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        log_sampled.reset(sampled_token)
+        request_id_var.reset(token)
 
 ## Calling the Backend from the frontend using docker networks
+async def proxy_to_backend(method, endpoint, path, json=None, params=None, headers=None):
+    """
+    Relays a call to the backend over the shared keep-alive client
+    The upstream body is streamed through and hop-by-hop headers are dropped
+    endpoint : route name picking the timeout, path : backend path of the call,
+    params / headers : query parameters and extra headers relayed with it
+    """
+    start = time.perf_counter()
+    upstream = backend_client.build_request(method, path, json=json, params=params, timeout=BACKEND_TIMEOUTS[endpoint],
+                                            headers={**(headers or {}), "X-Request-ID": request_id_var.get()})
+    try:
+        response = await backend_client.send(upstream, stream=True)
+    except httpx.ConnectError:
+        logger.error("Backend connection failed")
+        raise HTTPException(503, "Backend service unavailable")
+    except httpx.TimeoutException:
+        logger.error("Backend call '%s' timed out", endpoint)
+        raise HTTPException(504, "Backend service timed out")
+
+    async def close_upstream():
+        await response.aclose()
+        # Time of the whole proxied call, up to the last relayed byte
+        api_usage.observe(time.perf_counter() - start)
+
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=headers,
+        background=BackgroundTask(close_upstream)
+    )
+
+# Identical concurrent GETs share one backend call, answers are reused for PROXY_CACHE_TTL seconds
+proxy_cache = SingleFlightCache(ttl=PROXY_CACHE_TTL, max_entries=PROXY_CACHE_MAX_ENTRIES,
+                                max_bytes=PROXY_CACHE_MAX_BYTES, events_counter=proxy_cache_events)
+
+async def fetch_from_backend(endpoint, path, params=None, headers=None):
+    """
+    Buffered GET to the backend, its answer shared by the callers waiting on the same key
+    """
+    try:
+        response = await backend_client.get(path, params=params, timeout=BACKEND_TIMEOUTS[endpoint],
+                                            headers={**(headers or {}), "X-Request-ID": request_id_var.get()})
+    except httpx.ConnectError:
+        logger.error("Backend connection failed")
+        raise HTTPException(503, "Backend service unavailable")
+    except httpx.TimeoutException:
+        logger.error("Backend call '%s' timed out", endpoint)
+        raise HTTPException(504, "Backend service timed out")
+
+    # The body is relayed decoded, with its length set again
+    headers = {k: v for k, v in response.headers.items()
+               if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() not in ("content-length", "content-encoding")}
+    return CachedResponse(response.status_code, headers, response.content)
+
+async def proxy_cached_get(endpoint, path, params=None, headers=None):
+    """
+    GET relayed through the single-flight cache, keyed on the path, query parameters and relayed headers
+    endpoint : route name picking the timeout and labelling the cache events
+    """
+    start = time.perf_counter()
+    key = (path,
+           tuple(sorted(params.multi_items())) if params else (),
+           tuple(sorted(headers.items())) if headers else ())
+    cached = await proxy_cache.get(key, lambda: fetch_from_backend(endpoint, path, params, headers), route=endpoint)
+    api_usage.observe(time.perf_counter() - start)
+    return Response(content=cached.body, status_code=cached.status_code, headers=cached.headers)
+
 @router.post("/backend/predict")
 async def get_be_predict(input : input_data, request:Request):
     # Logging
@@ -162,20 +406,7 @@ async def get_be_predict(input : input_data, request:Request):
     # Increasing the counter of API per host
     api_counter_be.labels(endpoint = "/predict", client=request.client.host).inc()
     
-    async with httpx.AsyncClient(timeout=5) as client:
-        try:
-            response = await client.post(
-                "http://backend:4000/predict",
-                json=input.dict()
-            )
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-        except httpx.ConnectError:
-            logger.error("Backend connection failed")
-            raise HTTPException(503, "Backend service unavailable")
+    return await proxy_to_backend("POST", "/predict", "/predict", json=input.dict())
 
 @router.post("/backend/feedback")
 async def get_be_feedback(input: input_feedback, request: Request):
@@ -185,20 +416,7 @@ async def get_be_feedback(input: input_feedback, request: Request):
     # Increasing the counter of API per host
     api_counter_be.labels(endpoint="/feedback", client=request.client.host).inc()
     
-    async with httpx.AsyncClient(timeout=5) as client:
-        try:
-            response = await client.post(
-                "http://backend:4000/feedback",
-                json=input.dict()  # Correct: send input data as JSON
-            )
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-        except httpx.ConnectError:
-            logger.error("Backend connection failed")
-            raise HTTPException(503, "Backend service unavailable")
+    return await proxy_to_backend("POST", "/feedback", "/feedback", json=input.dict())
 
 @router.post("/backend/diagnostic")
 async def get_be_diagnostic(input: input_diagnostic, request: Request):
@@ -208,20 +426,7 @@ async def get_be_diagnostic(input: input_diagnostic, request: Request):
     # Increasing the counter of API per host
     api_counter_be.labels(endpoint="/diagnostic", client=request.client.host).inc()
     
-    async with httpx.AsyncClient(timeout=5) as client:
-        try:
-            response = await client.post(
-                "http://backend:4000/diagnostic",
-                json=input.dict()  # Convert input model to dict for JSON payload
-            )
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-        except httpx.ConnectError:
-            logger.error("Backend connection failed")
-            raise HTTPException(503, "Backend service unavailable")
+    return await proxy_to_backend("POST", "/diagnostic", "/diagnostic", json=input.dict())
 
 @router.get("/backend/visualizations/{plot_name}")
 async def get_be_visualizations(plot_name: str, request: Request):
@@ -231,19 +436,21 @@ async def get_be_visualizations(plot_name: str, request: Request):
     # Increasing the counter of API per host
     api_counter_be.labels(endpoint="/visualizations", client=request.client.host).inc()
 
-    async with httpx.AsyncClient(timeout=5) as client:
-        try:
-            response = await client.get(f"http://backend:4000/visualizations/{plot_name}")
+    return await proxy_cached_get("/visualizations", f"/visualizations/{plot_name}")
 
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
+@router.get("/backend/visualizations/{plot_name}/png")
+async def get_be_visualizations_png(plot_name: str, request: Request):
+    # Logging
+    logger.info("Calling backend '/visualizations/png' from frontend using docker network")
+
+    # Increasing the counter of API per host
+    api_counter_be.labels(endpoint="/visualizations/png", client=request.client.host).inc()
 
-        except httpx.ConnectError:
-            logger.error("Backend connection failed")
-            raise HTTPException(503, "Backend service unavailable")
+    if not PATH_NAME_PATTERN.fullmatch(plot_name):
+        raise HTTPException(400, "Invalid plot name")
+    # The browser validators go upstream, the ETag / Cache-Control headers (and 304s) come back as they are
+    headers = {name: request.headers[name] for name in VALIDATOR_HEADERS if name in request.headers}
+    return await proxy_cached_get("/visualizations", f"/visualizations/{plot_name}/png", headers=headers)
 
 @router.get("/backend/logs/{container_name}")
 async def get_be_logs(container_name: str, request: Request):
@@ -253,46 +460,61 @@ async def get_be_logs(container_name: str, request: Request):
     # Increasing the counter of API per host
     api_counter_be.labels(endpoint="/logs", client=request.client.host).inc()
 
-    async with httpx.AsyncClient(timeout=5) as client:
-        try:
-            response = await client.get(f"http://backend:4000/logs/{container_name}")
+    if not PATH_NAME_PATTERN.fullmatch(container_name):
+        raise HTTPException(400, "Invalid container name")
+    # Range / tail parameters (offset, limit, tail, before) relayed as they are
+    return await proxy_cached_get("/logs", f"/logs/{container_name}", params=request.query_params)
+
+@router.get("/backend/logs/{container_name}/follow")
+async def get_be_logs_follow(container_name: str, request: Request):
+    # Logging
+    logger.info("Calling backend '/logs/follow' from frontend using docker network")
 
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
+    # Increasing the counter of API per host
+    api_counter_be.labels(endpoint="/logs/follow", client=request.client.host).inc()
 
-        except httpx.ConnectError:
-            logger.error("Backend connection failed")
-            raise HTTPException(503, "Backend service unavailable")
+    if not PATH_NAME_PATTERN.fullmatch(container_name):
+        raise HTTPException(400, "Invalid container name")
+    # The event stream is relayed as it comes, Last-Event-ID lets a reconnecting browser resume
+    headers = {"Last-Event-ID": request.headers["last-event-id"]} if "last-event-id" in request.headers else None
+    return await proxy_to_backend("GET", "/logs/follow", f"/logs/{container_name}/follow",
+                                  params=request.query_params, headers=headers)
 
 app.include_router(router)
 
 # Get recent analyses
 @app.get("/api/history")
-async def get_history():
-    # Return only saved analyses, newest first
-    return [a for a in analyses_db if a["savedToHistory"]]
+async def get_history(response: Response, limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
+                      cursor: Optional[int] = Query(None, ge=1)):
+    # Saved analyses, newest first, one page at a time : the X-Next-Cursor header (absent on the
+    # last page) is the cursor of the next page
+    analyses, next_cursor = history_store.page(limit, cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return analyses
+
+# Record an analysis
+@app.post("/api/history")
+async def add_to_history(input: input_analysis):
+    return history_store.add(input.message, input.result, confidence=input.confidence,
+                             recommendations=input.recommendations, saved=input.savedToHistory)
 
 # Save analysis to history
 @app.post("/api/history/{analysis_id}")
 async def save_to_history(analysis_id: int):
-    for analysis in analyses_db:
-        if analysis["id"] == analysis_id:
-            analysis["savedToHistory"] = True
-            return {"success": True}
+    if history_store.save(analysis_id):
+        return {"success": True}
     
     raise HTTPException(status_code=404, detail="Analysis not found")
 
 # Serve the static files
 @app.get("/styles.css")
-async def get_css():
-    return FileResponse("styles.css")
+async def get_css(request:Request):
+    return static_response(request, "styles.css")
 
 @app.get("/script.js")
-async def get_js():
-    return FileResponse("script.js")
+async def get_js(request:Request):
+    return static_response(request, "script.js")
 
 # Run the server directly when script is executed
 if __name__ == "__main__":
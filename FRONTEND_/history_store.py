@@ -0,0 +1,265 @@
+## Analysis history of the frontend : indexed, bounded in-memory store with optional batched postgres writes ##
+
+import bisect
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {} (
+    id BIGINT PRIMARY KEY,
+    message TEXT NOT NULL,
+    result TEXT NOT NULL,
+    confidence REAL,
+    recommendations TEXT,
+    saved BOOLEAN NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+)
+"""
+
+
+class HistoryStore:
+    # fifo : oldest analysis first, lru : least recently read or saved first,
+    # unsaved_first : oldest analysis not saved to history first, then fifo
+    EVICTION_POLICIES = ("fifo", "lru", "unsaved_first")
+
+    def __init__(self, max_entries=10000, policy="unsaved_first", writer=None):
+        """
+        Analyses by id (dict), with a recency order for eviction and a sorted index of the saved ids
+        for cursor pagination
+        max_entries: Analyses kept in memory, the one picked by the eviction policy goes beyond that
+        policy: One of EVICTION_POLICIES
+        writer: Optional HistoryWriter persisting every new / saved analysis
+        """
+        if policy not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}, expected one of {self.EVICTION_POLICIES}")
+        self.max_entries = max_entries
+        self.policy = policy
+        self.writer = writer
+
+        self._entries = {}               # id -> analysis dict
+        self._order = OrderedDict()      # ids, oldest (or least recently used) first
+        self._unsaved = OrderedDict()    # ids not saved to history, oldest first
+        self._saved_ids = []             # ids saved to history, ascending
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, message, result, confidence=None, recommendations=None, saved=False):
+        """
+        Stores a new analysis under the next id, returns it
+        """
+        analysis = {"id": self._next_id,
+                    "message": message,
+                    "result": result,
+                    "confidence": confidence,
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "savedToHistory": saved,
+                    "recommendations": recommendations}
+        self._next_id += 1
+        self._insert(analysis)
+        if self.writer is not None:
+            self.writer.submit(analysis)
+        return analysis
+
+    def get(self, analysis_id):
+        """
+        Analysis by id, None when unknown (or evicted)
+        """
+        analysis = self._entries.get(analysis_id)
+        if analysis is not None and self.policy == "lru":
+            self._order.move_to_end(analysis_id)
+        return analysis
+
+    def save(self, analysis_id):
+        """
+        Marks an analysis as saved to history, False when unknown
+        """
+        analysis = self.get(analysis_id)
+        if analysis is None:
+            return False
+        if not analysis["savedToHistory"]:
+            analysis["savedToHistory"] = True
+            self._unsaved.pop(analysis_id, None)
+            bisect.insort(self._saved_ids, analysis_id)
+            if self.writer is not None:
+                self.writer.submit(analysis)
+        return True
+
+    def page(self, limit, cursor=None):
+        """
+        Saved analyses, newest first : the `limit` ones with an id below cursor (from the newest when None)
+        Returns: (analyses, next cursor or None on the last page)
+        """
+        end = len(self._saved_ids) if cursor is None else bisect.bisect_left(self._saved_ids, cursor)
+        start = max(0, end - limit)
+        ids = self._saved_ids[start:end][::-1]
+        return [self._entries[i] for i in ids], (ids[-1] if start > 0 else None)
+
+    def load(self, analyses):
+        """
+        Seeds the store with persisted analyses (oldest first), new ids continue after the largest one
+        """
+        for analysis in analyses:
+            self._insert(analysis)
+            self._next_id = max(self._next_id, analysis["id"] + 1)
+
+    def _insert(self, analysis):
+        analysis_id = analysis["id"]
+        self._entries[analysis_id] = analysis
+        self._order[analysis_id] = None
+        if analysis["savedToHistory"]:
+            bisect.insort(self._saved_ids, analysis_id)
+        else:
+            self._unsaved[analysis_id] = None
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        if self.policy == "unsaved_first" and self._unsaved:
+            analysis_id = next(iter(self._unsaved))
+        else:
+            analysis_id = next(iter(self._order))
+        analysis = self._entries.pop(analysis_id)
+        del self._order[analysis_id]
+        if analysis["savedToHistory"]:
+            del self._saved_ids[bisect.bisect_left(self._saved_ids, analysis_id)]
+        else:
+            del self._unsaved[analysis_id]
+
+
+class HistoryWriter:
+    def __init__(self, connect_fn, table="analysis_history", batch_size=100, flush_interval=1.0,
+                 max_queue=10000, rows_counter=None):
+        """
+        Upserts the analyses into postgres from a background thread, in batches
+        connect_fn: Callable returning a new psycopg2 connection
+        batch_size / flush_interval: A batch is written once it holds batch_size rows or is
+                                     flush_interval seconds old
+        max_queue: Rows waiting at most, beyond that new ones are dropped (the request never waits)
+        rows_counter: Optional prometheus Counter with a 'result' label (written / dropped)
+        """
+        self.connect_fn = connect_fn
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_counter = rows_counter
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._conn = None
+
+    def start(self):
+        """
+        Creates the table if needed and starts the writer thread
+        """
+        from psycopg2 import sql
+        self._conn = self.connect_fn()
+        with self._conn.cursor() as cursor:
+            cursor.execute(sql.SQL(HISTORY_TABLE_DDL).format(sql.Identifier(self.table)))
+        self._conn.commit()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """
+        Writes the rows still queued, then closes the connection
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def submit(self, analysis):
+        try:
+            self._queue.put_nowait(dict(analysis))
+        except queue.Full:
+            logger.warning("History write queue full, analysis %s not persisted", analysis['id'])
+            self._count("dropped")
+
+    def load_recent(self, limit):
+        """
+        The `limit` newest persisted analyses, oldest first (call before start, or from the writer thread)
+        """
+        from psycopg2 import sql
+        conn = self._conn or self.connect_fn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("SELECT id, message, result, confidence, recommendations, saved, created_at "
+                                       "FROM {} ORDER BY id DESC LIMIT %s").format(sql.Identifier(self.table)),
+                               (limit,))
+                rows = cursor.fetchall()
+        finally:
+            if conn is not self._conn:
+                conn.close()
+        return [{"id": row[0], "message": row[1], "result": row[2], "confidence": row[3],
+                 "recommendations": json.loads(row[4]) if row[4] else None,
+                 "savedToHistory": row[5], "timestamp": row[6].isoformat()}
+                for row in reversed(rows)]
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+                if row is None:
+                    stopping = True
+                else:
+                    batch.append(row)
+                    deadline = deadline or time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    def _flush(self, batch):
+        from psycopg2 import sql, OperationalError, InterfaceError
+        from psycopg2.extras import execute_values
+
+        # The last state of each analysis (created, then saved) is the one written
+        rows = {analysis["id"]: (analysis["id"], analysis["message"], analysis["result"], analysis["confidence"],
+                                 json.dumps(analysis["recommendations"]) if analysis["recommendations"] else None,
+                                 analysis["savedToHistory"], analysis["timestamp"])
+                for analysis in batch}
+        query = sql.SQL("INSERT INTO {} (id, message, result, confidence, recommendations, saved, created_at) "
+                        "VALUES %s ON CONFLICT (id) DO UPDATE SET saved = EXCLUDED.saved"
+                        ).format(sql.Identifier(self.table))
+        for attempt in range(2):
+            try:
+                with self._conn.cursor() as cursor:
+                    execute_values(cursor, query.as_string(self._conn), list(rows.values()))
+                self._conn.commit()
+                self._count("written", len(rows))
+                return
+            except (OperationalError, InterfaceError) as e:
+                # Connection lost : one retry on a new connection
+                logger.error("History write failed (%s), reconnecting", e)
+                try:
+                    self._conn.close()
+                    self._conn = self.connect_fn()
+                except Exception as e:
+                    logger.error("History database reconnection failed : %s", e)
+                    break
+            except Exception as e:
+                logger.error("History write failed : %s", e)
+                self._conn.rollback()
+                break
+        self._count("dropped", len(rows))
+
+    def _count(self, result, rows=1):
+        if self.rows_counter is not None:
+            self.rows_counter.labels(result=result).inc(rows)
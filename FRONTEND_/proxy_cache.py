@@ -0,0 +1,83 @@
+## Single-flight and short TTL cache of the idempotent GETs proxied by the frontend ##
+
+import asyncio
+import time
+from collections import OrderedDict, namedtuple
+
+# A buffered backend answer, shared by the callers of one key
+CachedResponse = namedtuple('CachedResponse', ['status_code', 'headers', 'body'])
+
+
+class SingleFlightCache:
+    def __init__(self, ttl=2.0, max_entries=128, max_bytes=64 * 1024 * 1024, events_counter=None,
+                 cacheable_statuses=(200, 304)):
+        """
+        Concurrent calls of one key share a single in-flight fetch, its answer is then kept ttl seconds
+        ttl: Seconds an answer is served from memory (0 keeps only the coalescing)
+        max_entries / max_bytes: Bounds of the kept answers (least recently used evicted first)
+        events_counter: Optional prometheus Counter with 'route' and 'event' labels
+                        (hit / miss / coalesced / eviction)
+        cacheable_statuses: Statuses of the answers kept, errors are only shared with the waiting callers
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.events_counter = events_counter
+        self.cacheable_statuses = cacheable_statuses
+
+        self._entries = OrderedDict()  # key -> (CachedResponse, expiry time)
+        self._bytes = 0
+        self._inflight = {}  # key -> asyncio.Task
+
+    async def get(self, key, fetch, route="-"):
+        """
+        Cached answer of the key, else the answer of the fetch in flight for it, else a new fetch
+        fetch: Coroutine function returning a CachedResponse
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(route, "hit")
+                return entry[0]
+            self._evict(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self._count(route, "miss")
+            # Own task, so that a caller going away does not cancel the fetch of the others
+            task = asyncio.create_task(self._fetch(key, fetch, route))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self._count(route, "coalesced")
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch, route):
+        try:
+            response = await fetch()
+            if self.ttl > 0 and response.status_code in self.cacheable_statuses:
+                self._store(key, response, route)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key, response, route):
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (response, time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+            self._count(route, "eviction")
+
+    def _evict(self, key):
+        response, _ = self._entries.pop(key)
+        self._bytes -= len(response.body)
+
+    def _count(self, route, event):
+        if self.events_counter is not None:
+            self.events_counter.labels(route=route, event=event).inc()
@@ -8,6 +8,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const concerningResult = document.querySelector('.result-card.concerning');
     const driftResult = document.querySelector('.result-card.drift');
     const saveBtns = document.querySelectorAll('.save-btn');
+    // Id of the last analysis recorded by /api/history, marked as saved by the save buttons
+    let currentAnalysisId = null;
     
     // Add form submit handler
     if (analysisForm) {
@@ -65,6 +67,21 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Scroll to results
             resultsSection.scrollIntoView({ behavior: 'smooth' });
+
+          // Recording the analysis in the history store
+          currentAnalysisId = null;
+          fetch('/api/history', {
+              method: 'POST',
+              headers: {
+                'Content-Type': 'application/json'
+              },
+              body: JSON.stringify({ "message" : message, "result" : String(data.risk) })
+          })
+          .then(response => response.ok ? response.json() : null)
+          .then(analysis => {
+            if (analysis) currentAnalysisId = analysis.id;
+          })
+          .catch(error => console.error('Error recording the analysis:', error));
           
           // Reset button text
           analysisForm.querySelector('button[type="submit"]').textContent = originalButtonText;
@@ -89,6 +106,11 @@ document.addEventListener('DOMContentLoaded', function() {
       btn.addEventListener('click', function() {
         this.textContent = 'Saved to history';
         this.disabled = true;
+
+        if (currentAnalysisId !== null) {
+          fetch(`/api/history/${currentAnalysisId}`, { method: 'POST' })
+            .catch(error => console.error('Error saving to history:', error));
+        }
         
         const historyList = document.querySelector('.history-list');
         const noHistory = document.querySelector('.no-history');
@@ -268,24 +290,22 @@ document.addEventListener('DOMContentLoaded', function() {
   });
 });
 
-async function fetchImage(plotName) {
+function fetchImage(plotName) {
+  // Raw PNG, kept by the browser cache and revalidated with its ETag (304 when unchanged)
+  const imgElement = document.getElementById('modal-image');
+  const errorElement = document.getElementById('modal-error');
 
-  try {
-    const response = await fetch(`/backend/visualizations/${plotName}`);
-    const data = await response.json();
-
-    if (!data.image_base64) throw new Error('No image data found in response');
-
-    const imgElement = document.getElementById('modal-image');
-    imgElement.src = `data:image/png;base64,${data.image_base64}`;
-    imgElement.alt = `Visualization: ${plotName}`;
+  imgElement.onload = () => {
+    errorElement.style.display = 'none';
     document.getElementById('image-modal').style.display = 'flex';
-
-  } catch (error) {
-    console.error('Error fetching image:', error);
-    document.getElementById('modal-error').textContent = `Failed to load image: ${error.message}`;
-    document.getElementById('modal-error').style.display = 'block';
-  }
+  };
+  imgElement.onerror = () => {
+    console.error('Error fetching image:', plotName);
+    errorElement.textContent = `Failed to load image: ${plotName}`;
+    errorElement.style.display = 'block';
+  };
+  imgElement.alt = `Visualization: ${plotName}`;
+  imgElement.src = `/backend/visualizations/${plotName}/png`;
 }
 
 
@@ -293,21 +313,100 @@ function closeModal() {
   document.getElementById('image-modal').style.display = 'none';
 }
 
+// Log viewer : the last lines first, older ones on demand, then the new lines streamed as they are written
+const LOG_TAIL_LINES = 500;
+// Lines kept on screen, the oldest ones are dropped while following
+const LOG_MAX_LINES = 5000;
+const logEncoder = new TextEncoder();
+let logState = null;
+let logStream = null;
+
+function splitLogLines(text) {
+  const lines = text.split('\n');
+  if (lines[lines.length - 1] === '') lines.pop();
+  return lines;
+}
+
+function renderLog(scrollToEnd) {
+  const container = document.querySelector('.log-modal-content');
+  const atEnd = container.scrollHeight - container.scrollTop - container.clientHeight < 20;
+  document.getElementById('modal-log-text').textContent = logState.lines.join('\n');
+  document.getElementById('log-older-btn').disabled = logState.firstOffset === 0;
+  if (scrollToEnd || atEnd) container.scrollTop = container.scrollHeight;
+}
+
+function setFollowStatus(text) {
+  document.getElementById('log-follow-status').textContent = text;
+}
+
 async function fetchLog(logName) {
+  closeLogStream();
   try {
-    const response = await fetch(`/backend/logs/${logName}`); // change if needed
+    const response = await fetch(`/backend/logs/${logName}?tail=${LOG_TAIL_LINES}`);
     const data = await response.json();
+    if (!response.ok) throw new Error(data.error || `HTTP ${response.status}`);
 
-    const logText = data.log_text; // assuming response like { "log_text": "..." }
-    const logElement = document.getElementById('modal-log-text');
-    logElement.textContent = logText;
-
+    // firstOffset : byte offset of the first line on screen, where older lines end
+    logState = { name: logName, firstOffset: data.offset, lines: splitLogLines(data.log_text) };
     document.getElementById('log-modal').style.display = 'flex';
+    renderLog(true);
+    followLog(logName, data.next_offset);
   } catch (error) {
     console.error('Error fetching log:', error);
   }
 }
 
+async function loadOlderLogs() {
+  if (!logState || logState.firstOffset === 0) return;
+  try {
+    const response = await fetch(`/backend/logs/${logState.name}?tail=${LOG_TAIL_LINES}&before=${logState.firstOffset}`);
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.error || `HTTP ${response.status}`);
+
+    // Keeping the lines in view where they were
+    const container = document.querySelector('.log-modal-content');
+    const fromBottom = container.scrollHeight - container.scrollTop;
+    logState.lines = splitLogLines(data.log_text).concat(logState.lines);
+    logState.firstOffset = data.offset;
+    renderLog(false);
+    container.scrollTop = container.scrollHeight - fromBottom;
+  } catch (error) {
+    console.error('Error fetching older log lines:', error);
+  }
+}
+
+function followLog(logName, offset) {
+  // The browser reconnects on its own, resuming from the id of the last event received
+  logStream = new EventSource(`/backend/logs/${logName}/follow?offset=${offset}`);
+  logStream.onopen = () => setFollowStatus('Following new lines');
+  logStream.onerror = () => setFollowStatus('Reconnecting...');
+  logStream.onmessage = (event) => {
+    logState.lines.push(...splitLogLines(event.data + '\n'));
+    const extra = logState.lines.length - LOG_MAX_LINES;
+    if (extra > 0) {
+      for (const line of logState.lines.splice(0, extra)) {
+        logState.firstOffset += logEncoder.encode(line).length + 1;
+      }
+    }
+    renderLog(false);
+  };
+  // The log file started over (rotated or truncated)
+  logStream.addEventListener('truncated', () => {
+    logState.lines = [];
+    logState.firstOffset = 0;
+    renderLog(true);
+  });
+}
+
+function closeLogStream() {
+  if (logStream) {
+    logStream.close();
+    logStream = null;
+  }
+  setFollowStatus('');
+}
+
 function closeLogModal() {
+  closeLogStream();
   document.getElementById('log-modal').style.display = 'none';
 }